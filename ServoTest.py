@@ -1,61 +1,36 @@
-import RPi.GPIO as GPIO
+import argparse
 import time
+from renguard.core import MATERIAL_ACTIONS
+from renguard.planner import ServoPlanner
+from renguard.servos import add_servo_args, open_servos
 
-# Setup
-servo_pins = [17, 18]  # Servo1 = GPIO17 (Base), Servo2 = GPIO18 (Drop)
+# Pick the servo backend (pigpio, gpio or sim) and the planner calibration
+args = add_servo_args(argparse.ArgumentParser()).parse_args()
 
-GPIO.setmode(GPIO.BCM)
-for pin in servo_pins:
-    GPIO.setup(pin, GPIO.OUT)
+# Setup: Servo1 = GPIO17 (Base), Servo2 = GPIO18 (Drop)
+servos = open_servos(args.servo_driver, 17, 18)
 
-# Initialize PWM at 50Hz
-servo1 = GPIO.PWM(servo_pins[0], 50)  # Base rotation
-servo2 = GPIO.PWM(servo_pins[1], 50)  # Drop actuator
-
-servo1.start(0)
-servo2.start(0)
-
-# Convert angle (0–180) into duty cycle and rotate servo
-def set_angle(servo, angle):
-
-    duty = 2 + (angle / 18)  # duty(2%-12%) = 2% + (angle / 18) // 2%(0°), 7%(60°), 12%(120°)
-    servo.ChangeDutyCycle(duty)
-    time.sleep(0.5)
-    servo.ChangeDutyCycle(0)  #Reset cycle
-
-# Material (base_angle, drop_angle)
-material_actions = {
-    "Cardboard": (0, 0),      # Base 0°, Drop 0°
-    "Plastic":   (0, 120),    # Base 0°, Drop 120°
-    "Glass":     (60, 0),     # Base 60°, Drop 0°
-    "Tin":       (60, 120)    # Base 60°, Drop 120°
-}
+# Same motion planning as the detectors: no-op moves are skipped and waits follow the angle moved
+planner = ServoPlanner(servos, speed=args.servo_speed, drop_hold=args.drop_hold)
 
 try:
     test_sequence = ["Cardboard", "Plastic", "Glass", "Tin"]
 
     while True:
         for material in test_sequence:
-            base_angle, drop_angle = material_actions[material]
+            base_angle, drop_angle = MATERIAL_ACTIONS[material]
             print(f"\nTesting: {material} Base {base_angle}°, Drop {drop_angle}°")
 
-            # Base movement
-            set_angle(servo1, base_angle)
-            time.sleep(1)
-
-            # Drop movement
-            set_angle(servo2, drop_angle)
-            time.sleep(1)
-
-            # Reset drop to neutral (90°)
-            set_angle(servo2, 90)
-            time.sleep(1)
+            # Base movement, drop, and reset to neutral (90°), which finishes during the next base move
+            t_start = time.perf_counter()
+            planner.sort(base_angle, drop_angle)
+            print(f"Cycle took {time.perf_counter() - t_start:.2f}s")
 
 except KeyboardInterrupt:
     print("\nStopping...")
 
 # Reset Motors and GPIO
 finally:
-    servo1.stop()
-    servo2.stop()
-    GPIO.cleanup()
\ No newline at end of file
+    planner.idle()
+    print("Servo moves:", planner.stats())
+    servos.close()
@@ -1,53 +1,44 @@
-from ultralytics import YOLO
-from collections import Counter
-import time
-
-# Function to simplify detailed labels to general material categories
-def simplify_label(label):
-    if label.startswith("Tin_Can"):
-        return "Tin"
-    elif label.startswith("Cardboard"):
-        return "Cardboard"
-    elif label.startswith("Plastic"):
-        return "Plastic"
-    elif label.startswith("Glass"):
-        return "Glass"
-    else:
-        return "Unknown"
-
-# Load the YOLO model (update this path if needed)
-model = YOLO('my_model.pt')
-
-# Store simplified labels per frame
-labels_per_frame = []
+import argparse
+from renguard.core import ClassTable, iter_frames, add_model_args, check_model_args, load_model
+from renguard.eventlog import DetectionLog
+from renguard.motion import add_motion_args, gate_from_args
+from renguard.roi import parse_roi
+
+# Define and parse user input arguments (model, backend, precision, imgsz, motion gate)
+parser = add_motion_args(add_model_args(argparse.ArgumentParser()))
+args = check_model_args(parser, parser.parse_args())
+
+# Skips the model on frames where nothing moves in the chute (--no-gate to disable)
+gate = gate_from_args(args)
+# Only the drop zone goes to the model; boxes come back in full-frame coordinates
+roi = parse_roi(args.roi)
+
+# Load the YOLO model (update with --model/--backend if needed)
+model = load_model(args.model, args.backend, args.precision)
+
+# Class id -> material table, built once from the model's label map
+table = ClassTable(model.names)
+
+# Stream detections to detected.txt as they happen (empty frames are run-length encoded)
+log = DetectionLog('detected.txt')
 
 print("Starting detection... Press Ctrl+C to stop.\n")
 
 try:
     #Begin webcam stream
-    for result in model(source=0, stream=True, imgsz=(1280, 720)):
-        frame_labels = []
-
-        for box in result.boxes:
-            cls_id = int(box.cls[0])
-            raw_label = result.names[cls_id]
-            simple_label = simplify_label(raw_label)
-            frame_labels.append(simple_label)
-
-        labels_per_frame.append(frame_labels)
-        print("Detected materials in this frame:", frame_labels)
+    for frame in iter_frames(model, table, source=0, imgsz=args.imgsz, gate=gate, roi=roi):
+        log.write_frame(frame.index, frame.detections)
+        print("Detected materials in this frame:", frame.labels)
 
 except KeyboardInterrupt:
     print("\nDetection stopped by user.")
+finally:
+    log.close()
+    if gate:
+        print("Motion gate:", gate.stats())
 
-# Save results to a text file
-with open('detected.txt', 'w') as f:
-    for i, frame_labels in enumerate(labels_per_frame):
-        f.write(f"Frame {i + 1}: {', '.join(frame_labels)}\n")
-
-# Print a summary of all detected materials
-all_materials = [label for frame in labels_per_frame for label in frame]
-material_counts = Counter(all_materials)
+# Print a summary of all detected materials (counted as they were logged)
+material_counts = log.detection_counts
 
 print("\nSummary of detected materials:")
 for material, count in material_counts.items():
@@ -1,57 +1,58 @@
 # Updated detect.py with a Flask web server
 
-from ultralytics import YOLO
-from collections import Counter
-from gpiozero import Servo
-from gpiozero.pins.pigpio import PiGPIOFactory
-from time import sleep
-from flask import Flask, jsonify
+import argparse
+import time
+from flask import Flask, Response, jsonify, stream_with_context
 from flask_cors import CORS
 from threading import Thread
+from renguard.core import ClassTable, iter_frames, add_model_args, check_model_args, load_model
+from renguard.counters import CounterStore, json_response
+from renguard.events import EventBroadcaster
+from renguard.decision import add_decision_args
+from renguard.evidence import add_evidence_args, archive_from_args
+from renguard.metrics import Metrics, add_metrics_args
+from renguard.motion import add_motion_args
+from renguard.servos import add_servo_args
+from renguard.sortbin import open_bin
 
-# Servo setup
-factory = PiGPIOFactory()
-servo1 = Servo(17, pin_factory=factory)  # Base rotation
-servo2 = Servo(18, pin_factory=factory)  # Drop actuator
-
-# Helper to convert degrees to gpiozero value (-1 to 1)
-def angle_to_value(degrees):
-    """Converts a degree value to the -1 to 1 range for the servo."""
-    return (degrees / 90.0) - 1
-
-# Servo action map based on material
-material_actions = {
-    "Cardboard":  (0, 0),     # 0° base, 0° drop
-    "Plastic":    (0, 120),   # 0° base, 120° drop
-    "Glass":      (60, 0),    # 60° base, 0° drop
-    "Tin":        (60, 120)   # 60° base, 120° drop
-}
-
-# Simplify YOLO label to material
-def simplify_label(label):
-    """Simplifies the raw YOLO label to a known material category."""
-    if label.startswith("Tin_Can"):
-        return "Tin"
-    elif label.startswith("Cardboard"):
-        return "Cardboard"
-    elif label.startswith("Plastic"):
-        return "Plastic"
-    elif label.startswith("Glass"):
-        return "Glass"
-    else:
-        return "Unknown"
-
-# Load YOLO model
-model = YOLO('my_model.pt')
-
-# Global variable to store detected materials and their counts
-# This is accessed by both the Flask app and the detection thread.
-material_counts = {
+# Define and parse user input arguments (model, backend, precision, imgsz, motion gate, voting, servo driver, evidence)
+parser = argparse.ArgumentParser()
+for add_args in (add_model_args, add_metrics_args, add_motion_args, add_decision_args, add_servo_args, add_evidence_args):
+    add_args(parser)
+args = check_model_args(parser, parser.parse_args())
+metrics = Metrics()
+# The frame behind every sort decision, for audits (--evidence "" to turn off)
+evidence = archive_from_args(args)
+
+# Detected materials and their counts, shared by the Flask app and the detection thread.
+# Increments are atomic and readers get an immutable snapshot without taking a lock.
+material_counts = CounterStore({
     "Plastic": 0,
     "Cardboard": 0,
     "Glass": 0,
     "Tin": 0
-}
+})
+
+# Pushes count deltas and sort events to every connected dashboard, resyncing any that fall behind
+events = EventBroadcaster().track(material_counts)
+
+def on_sort(frame, decision, queued):
+    """Updates the dashboard counts and pushes the sort to live dashboards."""
+    material = decision.material
+    if material in material_counts.snapshot().counts:
+        # Publishes the "delta" event too
+        material_counts.increment(material)
+    events.publish("sort", {"material": material, "item": decision.id, "time": time.time(), "queued": queued,
+                            "decision_ms": round(decision.latency * 1000), "reason": decision.reason})
+
+# Motion gate, ROI, tracker, votes and servos (GPIO 17 base rotation, GPIO 18 drop actuator;
+# --servo-driver sim runs without hardware). Servo cycles run on the sorter thread so the
+# detection loop never waits on the mechanism
+station = open_bin(args, metrics, evidence=evidence, on_sort=on_sort).start()
+
+# Load YOLO model and build the class id -> material table once
+model = load_model(args.model, args.backend, args.precision)
+table = ClassTable(model.names)
 
 # Flask App setup
 app = Flask(__name__)
@@ -61,7 +62,33 @@ CORS(app)  # Enable CORS for the web page
 @app.route('/data')
 def get_data():
     """Returns the current material counts as a JSON response."""
-    return jsonify(material_counts)
+    return json_response(material_counts)
+
+# Live stream for dashboards: current totals on connect, then deltas and sort events as they happen
+@app.route('/stream')
+def stream():
+    """Server-Sent Events stream of "counts", "delta" and "sort" events."""
+    response = Response(stream_with_context(events.stream()),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# API endpoint to check on the sorting mechanism
+@app.route('/sorter')
+def get_sorter_stats():
+    """Returns the sorter queue depth, dropped jobs and actuation latency."""
+    return jsonify(station.sorter.stats())
+
+# API endpoint for per-stage latency stats (capture, inference, actuation, ...)
+@app.route('/metrics')
+def get_metrics():
+    """Returns rolling mean and p50/p95/p99 latency for each pipeline stage, plus the motion gate's skip rate."""
+    summary = metrics.summary()
+    if station.gate:
+        summary["motion_gate"] = station.gate.stats()
+    summary["decisions"] = station.decider.stats()
+    return jsonify(summary)
 
 # A thread to run the YOLO detection continuously in the background
 def run_detection():
@@ -72,43 +99,21 @@ def run_detection():
     print("Starting detection... Press Ctrl+C to stop.")
     try:
         # source=0 means a webcam
-        for result in model(source=0, stream=True, imgsz=(1280, 720)):
-            # Loop through each detected object in the frame
-            for box in result.boxes:
-                cls_id = int(box.cls[0])
-                raw_label = result.names[cls_id]
-                material = simplify_label(raw_label)
-                
-                # Update the global counts for the web dashboard
-                if material in material_counts:
-                    material_counts[material] += 1
-                
-                print(f"Detected: {material}")
-
-                # Control servos for sorting
-                if material in material_actions:
-                    base_angle, drop_angle = material_actions[material]
-                    print(f"\nSorting: {material} -> Base {base_angle}°, Drop {drop_angle}°")
-                    
-                    # Move base
-                    servo1.value = angle_to_value(base_angle)
-                    sleep(1)
-                    
-                    # Drop
-                    servo2.value = angle_to_value(drop_angle)
-                    sleep(1)
-                    
-                    # Return drop to neutral (90° value=0)
-                    servo2.value = 0
-                    sleep(0.5)
-
-            # Wait a moment before processing the next frame
-            sleep(0.5)
-            
+        for frame in iter_frames(model, table, source=0, imgsz=args.imgsz, metrics=metrics, gate=station.gate,
+                                 roi=station.roi):
+            # Each item is counted and sorted once, when the votes for it settle; on_sort updates the dashboards
+            station.handle(frame)
+            metrics.periodic(args.metrics_interval, csv_path=args.metrics, console=False)
+
     except KeyboardInterrupt:
         print("\nDetection stopped by user.")
     except Exception as e:
         print(f"An error occurred in detection thread: {e}")
+    finally:
+        station.close()
+        print("Sorter stats:", station.sorter.stats(), "Servo moves:", station.planner.stats())
+        if evidence:
+            evidence.close()
 
 # Start the detection thread
 detection_thread = Thread(target=run_detection)
@@ -118,4 +123,5 @@ detection_thread.start()
 # Run the Flask app
 if __name__ == '__main__':
     # Run on all available network interfaces on port 5000
-    app.run(host='0.0.0.0', port=5000)
+    # threaded so each live dashboard stream gets its own thread
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,8 @@
+# Ren-Guard detection and sorting package.
+# Importing this package is cheap: Ultralytics and the GPIO libraries are
+# only loaded when a model or servo driver is actually created.
+
+from renguard.core import (MATERIAL_ACTIONS, MATERIALS, ClassTable, Frame,
+                           iter_frames, load_model, simplify_label)
+from renguard.actuator import SortingQueue
+from renguard.tracker import Tracker
@@ -0,0 +1,131 @@
+# Background servo worker so sorting never blocks the detection loop.
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# One physical sort request: which material and where the servos need to go
+SortJob = namedtuple('SortJob', ['material', 'base_angle', 'drop_angle', 'queued_at'])
+
+
+class SortingQueue:
+    """
+    Runs sort cycles on a dedicated thread fed by a bounded queue.
+
+    The detection loop only calls submit(), which never waits: if the
+    mechanism is still busy and the queue is full, the job is dropped and
+    counted instead of stalling the camera and YOLO.
+    """
+
+    def __init__(self, sort_fn, maxsize=4, metrics=None, idle_fn=None):
+        # sort_fn(base_angle, drop_angle) performs one full servo cycle
+        self.sort_fn = sort_fn
+        # Optional idle_fn() runs whenever the queue runs empty, e.g. ServoPlanner.idle
+        # to finish a move that would otherwise overlap with the next job
+        self.idle_fn = idle_fn
+        # Optional renguard.metrics.Metrics to record actuation latency in
+        self.metrics = metrics
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.idle_failed = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='sorter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, material, base_angle, drop_angle):
+        """Queues a sort job. Returns False if the queue was full and the job was dropped."""
+        job = SortJob(material, base_angle, drop_angle, time.perf_counter())
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"Sorter busy, dropped {material} (queue depth {self.jobs.qsize()})")
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+
+            t_start = time.perf_counter()
+            try:
+                self.sort_fn(job.base_angle, job.drop_angle)
+                ok = True
+            except Exception as e:
+                print(f"Sorting {job.material} failed: {e}")
+                ok = False
+            t_stop = time.perf_counter()
+
+            latency = t_stop - t_start
+            wait = t_start - job.queued_at
+            if self.metrics is not None:
+                self.metrics.add('actuation', latency)
+            with self._lock:
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.last_latency = latency
+                self.max_latency = max(self.max_latency, latency)
+                self.total_latency += latency
+                self.total_wait += wait
+            print(f"Sorted {job.material} in {latency:.2f}s (waited {wait:.2f}s, queue depth {self.jobs.qsize()})")
+            if self.idle_fn is not None and self.jobs.empty():
+                try:
+                    self.idle_fn()
+                except Exception as e:
+                    # Keep the worker alive so later jobs still run (or fail with their own message)
+                    print(f"Sorter idle step failed: {e}")
+                    with self._lock:
+                        self.idle_failed += 1
+
+    def stats(self):
+        """Returns a snapshot of queue depth, drop count and actuation latency."""
+        with self._lock:
+            done = self.completed + self.failed
+            return {
+                "queue_depth": self.jobs.qsize(),
+                "queue_size": self.jobs.maxsize,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "idle_failed": self.idle_failed,
+                "dropped": self.dropped,
+                "last_latency": round(self.last_latency, 3),
+                "avg_latency": round(self.total_latency / done, 3) if done else 0.0,
+                "max_latency": round(self.max_latency, 3),
+                "avg_wait": round(self.total_wait / done, 3) if done else 0.0,
+            }
+
+    def stop(self, drain=False):
+        """
+        Stops the worker after the job in progress. Pending jobs are discarded
+        (and counted as dropped) unless drain is True.
+        """
+        if not drain:
+            while True:
+                try:
+                    self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                with self._lock:
+                    self.dropped += 1
+        if self._thread.is_alive():
+            self.jobs.put(None)
+            self._thread.join()
@@ -0,0 +1,183 @@
+# Inference backend selection and model export for the Pi 4.
+#
+# Exported models are named <stem>_<precision><suffix> next to the .pt file,
+# e.g. my_model_fp16_ncnn_model/ or my_model_int8.onnx. The suffix is what
+# Ultralytics uses to pick its runtime, so the exported path can be handed
+# straight to YOLO().
+
+import glob
+import os
+
+# The model was trained at imgsz 480 (train/args.yaml). Exported backends
+# have static input shapes, so export and inference must both use this.
+TRAIN_IMGSZ = 480
+
+# backend -> (Ultralytics export format, path suffix, supported precisions)
+BACKENDS = {
+    "pt":          (None,       ".pt",             ("fp32",)),
+    "ncnn":        ("ncnn",     "_ncnn_model",     ("fp32", "fp16")),
+    "onnxruntime": ("onnx",     ".onnx",           ("fp32", "int8")),
+    "openvino":    ("openvino", "_openvino_model", ("fp32", "fp16", "int8")),
+}
+PRECISIONS = ("fp32", "fp16", "int8")
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def check_backend(backend, precision):
+    """Raises ValueError for an unknown backend or unsupported precision."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of: {', '.join(BACKENDS)}")
+    supported = BACKENDS[backend][2]
+    if precision not in supported:
+        raise ValueError(f"Backend '{backend}' supports {', '.join(supported)}, not '{precision}'")
+
+
+def exported_path(model_path, backend, precision="fp32"):
+    """Path the exported model for this backend/precision lives at."""
+    check_backend(backend, precision)
+    if backend == "pt":
+        return model_path
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}_{precision}{BACKENDS[backend][1]}"
+
+
+def resolve_model(model_path, backend="pt", precision="fp32"):
+    """
+    Returns the path to load for the requested backend. A path that is
+    already an exported model (e.g. yolo11n_ncnn_model) is used as is.
+    Raises ValueError for a backend/precision pair that doesn't exist.
+    """
+    check_backend(backend, precision)
+    if backend == "pt" or not model_path.endswith(".pt"):
+        return model_path
+    path = exported_path(model_path, backend, precision)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{path} not found. Export it first with: "
+            f"python -m renguard.export --model {model_path} --backend {backend} --precision {precision}")
+    return path
+
+
+def calibration_images(calib_dir, limit=None):
+    """Sorted list of image files in a representative calibration folder."""
+    files = sorted(f for f in glob.glob(os.path.join(calib_dir, '*'))
+                   if os.path.splitext(f)[1].lower() in IMG_EXTS)
+    if not files:
+        raise FileNotFoundError(f"No calibration images found in {calib_dir}")
+    return files[:limit] if limit else files
+
+
+def write_calibration_yaml(calib_dir, names, yaml_path):
+    """
+    Writes a minimal Ultralytics dataset file whose train/val splits both
+    point at the calibration folder. Used for INT8 calibration only.
+    """
+    calib_dir = os.path.abspath(calib_dir)
+    with open(yaml_path, 'w') as f:
+        f.write(f"path: {calib_dir}\n")
+        f.write("train: .\n")
+        f.write("val: .\n")
+        f.write("names:\n")
+        for i in sorted(names):
+            f.write(f"  {i}: {names[i]}\n")
+    return yaml_path
+
+
+def letterbox_blob(image, imgsz):
+    """Letterboxes a BGR image to imgsz x imgsz and returns a 1x3xHxW float32 RGB blob."""
+    import cv2
+    import numpy as np
+
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    nh, nw = round(h * scale), round(w * scale)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob)
+
+
+def quantize_onnx_int8(onnx_path, calib_dir, out_path, imgsz=TRAIN_IMGSZ, limit=200):
+    """
+    Statically quantizes an fp32 ONNX export to INT8 with onnxruntime,
+    calibrating on images from calib_dir. The Ultralytics metadata (class
+    names, imgsz, stride) is copied over so the result loads with YOLO().
+    """
+    import cv2
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat,
+                                          QuantType, quantize_static)
+
+    files = calibration_images(calib_dir, limit)
+    source = onnx.load(onnx_path)
+    input_name = source.graph.input[0].name
+
+    class FolderReader(CalibrationDataReader):
+        def __init__(self):
+            self.files = iter(files)
+
+        def get_next(self):
+            for path in self.files:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: letterbox_blob(image, imgsz)}
+            return None
+
+    quantize_static(onnx_path, out_path, FolderReader(),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True)
+
+    quantized = onnx.load(out_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, out_path)
+    return out_path
+
+
+def export_model(model_path, backend, precision="fp32", imgsz=TRAIN_IMGSZ, calib_dir=None):
+    """
+    Exports a .pt model for the given backend and precision and returns the
+    exported path. INT8 needs calib_dir, a folder of representative images
+    (ideally real frames from the bin camera).
+    """
+    import shutil
+    import tempfile
+    from renguard.core import load_model
+
+    check_backend(backend, precision)
+    if backend == "pt":
+        return model_path
+    if precision == "int8" and not calib_dir:
+        raise ValueError("INT8 export needs a calibration image folder (--calib)")
+
+    fmt = BACKENDS[backend][0]
+    target = exported_path(model_path, backend, precision)
+    model = load_model(model_path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if backend == "onnxruntime":
+            onnx_path = model.export(format=fmt, imgsz=imgsz, simplify=True)
+            if precision == "int8":
+                quantize_onnx_int8(onnx_path, calib_dir, target, imgsz=imgsz)
+                return target
+            out = onnx_path
+        else:
+            kwargs = {"format": fmt, "imgsz": imgsz, "half": precision == "fp16"}
+            if precision == "int8":
+                calibration_images(calib_dir)
+                kwargs["int8"] = True
+                kwargs["data"] = write_calibration_yaml(
+                    calib_dir, model.names, os.path.join(tmp, "calib.yaml"))
+            out = model.export(**kwargs)
+
+    if os.path.abspath(out) != os.path.abspath(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        shutil.move(out, target)
+    return target
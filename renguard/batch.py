@@ -0,0 +1,104 @@
+# Headless batched inference over a folder of images.
+#
+# Images are decoded by a background thread pool while the model runs on
+# the previous batch, and results are streamed to a JSON Lines file (one
+# object per image with its boxes, classes and confidences).
+#
+# Example:
+#   python -m renguard.batch --source archive/ --batch 16 --output results.jsonl
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def list_images(folder):
+    """Sorted image files in a folder."""
+    return sorted(f for f in glob.glob(os.path.join(folder, '*'))
+                  if os.path.splitext(f)[1].lower() in IMG_EXTS)
+
+
+def run_batch(model, files, out_path, batch_size=16, imgsz=None, conf=0.25, workers=4):
+    """
+    Runs the model over files in batches of batch_size and writes one JSON
+    line per image to out_path. Returns (images processed, elapsed seconds).
+    """
+    import cv2
+    from renguard.postprocess import to_arrays
+
+    names = model.names
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    kwargs = {"conf": conf, "verbose": False}
+    if imgsz:
+        kwargs["imgsz"] = imgsz
+
+    done = 0
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool, open(out_path, 'w') as out:
+        def decode(batch):
+            return [pool.submit(cv2.imread, path) for path in batch]
+
+        # Keep the next batch decoding while the current one is inferred
+        pending = decode(batches[0]) if batches else []
+        for b, batch in enumerate(batches):
+            frames = [f.result() for f in pending]
+            pending = decode(batches[b + 1]) if b + 1 < len(batches) else []
+
+            readable = [(path, frame) for path, frame in zip(batch, frames) if frame is not None]
+            for path, frame in zip(batch, frames):
+                if frame is None:
+                    out.write(json.dumps({"image": path, "error": "unreadable"}) + "\n")
+
+            if readable:
+                results = model([frame for _, frame in readable], **kwargs)
+                for (path, _), result in zip(readable, results):
+                    dets = to_arrays(result.boxes)
+                    cls = dets.cls.tolist()
+                    out.write(json.dumps({
+                        "image": path,
+                        "boxes": [[round(v, 1) for v in box] for box in dets.xyxy.tolist()],
+                        "classes": cls,
+                        "labels": [names[c] for c in cls],
+                        "conf": [round(c, 4) for c in dets.conf.tolist()],
+                    }) + "\n")
+
+            done += len(batch)
+            elapsed = time.perf_counter() - t_start
+            print(f'{done}/{len(files)} images, {done / elapsed:.1f} images/sec')
+
+    return done, time.perf_counter() - t_start
+
+
+def main(argv=None):
+    from renguard.core import add_model_args, check_model_args, load_model
+
+    parser = argparse.ArgumentParser(description='Run the model headless over a folder of images in batches.')
+    parser.add_argument('--source', help='Folder of images', required=True)
+    parser.add_argument('--output', help='JSON Lines file to write results to', default='results.jsonl')
+    parser.add_argument('--batch', help='Images per inference call (exported models with a fixed batch size need 1)',
+                        type=int, default=16)
+    parser.add_argument('--workers', help='Image decoding threads', type=int, default=4)
+    parser.add_argument('--thresh', help='Minimum confidence threshold', type=float, default=0.25)
+    add_model_args(parser)
+    args = check_model_args(parser, parser.parse_args(argv))
+
+    files = list_images(args.source)
+    if not files:
+        print(f'ERROR: No images found in {args.source}.')
+        return 1
+
+    model = load_model(args.model, args.backend, args.precision)
+    done, elapsed = run_batch(model, files, args.output, batch_size=args.batch, imgsz=args.imgsz,
+                              conf=args.thresh, workers=args.workers)
+    print(f'Processed {done} images in {elapsed:.1f}s ({done / elapsed:.1f} images/sec). Results saved to {args.output}.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
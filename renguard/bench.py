@@ -0,0 +1,247 @@
+# Replay benchmark: recorded clip -> detect -> decide -> actuate -> report.
+#
+# Runs the same code path as detect.py on a video file or an image folder,
+# with the servos simulated on a virtual clock, so throughput can be
+# measured on any Linux box. Frame i of the clip happens at (i - 1) / fps
+# seconds; decisions, servo cycles and the sorter queue all run in that
+# clip time, so results don't depend on how fast the machine replays.
+#
+# The optional ground truth is a CSV with one row per item that passed:
+#   time,material
+#   3.2,Plastic
+#   7.9,Tin
+#
+# Example:
+#   python -m renguard.bench --model my_model.pt --backend ncnn --source clips/run1.mp4 \
+#       --truth clips/run1.csv --output bench.json
+
+import argparse
+import csv
+import json
+import resource
+import sys
+import time
+from collections import Counter, defaultdict
+
+from renguard.core import MATERIAL_ACTIONS, ClassTable, add_model_args, check_model_args, iter_frames, load_model
+from renguard.decision import add_decision_args, engine_from_args
+from renguard.metrics import Metrics
+from renguard.motion import add_motion_args, gate_from_args
+from renguard.planner import ServoPlanner
+from renguard.roi import parse_roi
+from renguard.servos import SimClock, SimulatedServos
+from renguard.tracker import Tracker
+
+
+def load_truth(path):
+    """Reads a time,material ground-truth CSV into a time-sorted list."""
+    with open(path, newline='') as f:
+        return sorted((float(row['time']), row['material']) for row in csv.DictReader(f))
+
+
+def score_sorts(sorts, truth, tolerance=2.0):
+    """
+    Matches each ground-truth item to the closest unmatched sort within
+    tolerance seconds and counts correct, wrong, missed and extra sorts.
+    """
+    unmatched = list(range(len(sorts)))
+    confusion = defaultdict(Counter)
+    correct = wrong = missed = 0
+    for t, material in truth:
+        close = [i for i in unmatched if abs(sorts[i]['time'] - t) <= tolerance]
+        if not close:
+            missed += 1
+            confusion[material]['missed'] += 1
+            continue
+        best = min(close, key=lambda i: abs(sorts[i]['time'] - t))
+        unmatched.remove(best)
+        predicted = sorts[best]['material']
+        confusion[material][predicted] += 1
+        if predicted == material:
+            correct += 1
+        else:
+            wrong += 1
+    return {
+        "truth_items": len(truth),
+        "correct": correct,
+        "wrong": wrong,
+        "missed": missed,
+        "extra": len(unmatched),
+        "accuracy": round(correct / len(truth), 4) if truth else None,
+        "precision": round(correct / len(sorts), 4) if sorts else None,
+        "confusion": {m: dict(c) for m, c in confusion.items()},
+    }
+
+
+class SimulatedSorter:
+    """
+    SortingQueue stand-in on a SimClock: each job starts when the decision
+    is made or when the previous cycle ends, and is dropped if maxsize jobs
+    are already waiting, like the real queue.
+    """
+
+    def __init__(self, planner, clock, maxsize=4, metrics=None):
+        self.planner = planner
+        self.clock = clock
+        self.maxsize = maxsize
+        self.metrics = metrics
+        self.starts = []
+        self.completed = 0
+        self.dropped = 0
+        self.total_wait = 0.0
+
+    def submit(self, t, base_angle, drop_angle):
+        """Runs one cycle for a decision at clip time t. Returns its finish time, or None if dropped."""
+        # Jobs accepted earlier that have not started by t are still in the queue
+        self.starts = [s for s in self.starts if s > t]
+        if len(self.starts) >= self.maxsize:
+            self.dropped += 1
+            return None
+        self.clock.advance_to(t)
+        start = self.clock()
+        self.starts.append(start)
+        self.planner.sort(base_angle, drop_angle)
+        done = self.clock()
+        self.completed += 1
+        self.total_wait += start - t
+        if self.metrics is not None:
+            self.metrics.add('actuation', done - start)
+        return done
+
+    def stats(self):
+        return {"completed": self.completed, "dropped": self.dropped,
+                "avg_wait": round(self.total_wait / self.completed, 3) if self.completed else 0.0}
+
+
+def clip_fps(source, default=30.0):
+    """Frame rate of a video file, or default for image folders and unknown rates."""
+    import os
+
+    import cv2
+
+    if os.path.isdir(source):
+        return default
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps if fps and fps > 0 else default
+
+
+def run_benchmark(model, source, fps, imgsz, engine, planner, clock, gate=None, roi=None, min_conf=0.0,
+                  truth=None, tolerance=2.0, queue_size=4):
+    """Replays source through the sort pipeline and returns the report dict."""
+    table = ClassTable(model.names)
+    metrics = Metrics(size=100000)
+    engine.metrics = metrics
+    tracker = Tracker(iou_threshold=0.3, min_hits=3, max_age=10)
+    sorter = SimulatedSorter(planner, clock, maxsize=queue_size, metrics=metrics)
+
+    sorts = []
+    frames = 0
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    # The gate's cooldown runs in clip time too, so gated replays don't depend on machine speed
+    for frame in iter_frames(model, table, source=source, imgsz=imgsz, min_conf=min_conf,
+                             metrics=metrics, gate=gate, roi=roi, clock=lambda index: (index - 1) / fps):
+        frames = frame.index
+        t = (frame.index - 1) / fps
+        tracker.update(frame.detections)
+        for decision in engine.update(frame.detections, tracker.detection_ids, tracker.active_ids, now=t):
+            base_angle, drop_angle = MATERIAL_ACTIONS[decision.material]
+            done = sorter.submit(t, base_angle, drop_angle)
+            sorts.append({"time": round(t, 3), "item": decision.id, "material": decision.material,
+                          "reason": decision.reason, "decision_ms": round(decision.latency * 1000),
+                          "sorted_at": None if done is None else round(done, 3)})
+    wall = time.perf_counter() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    clip_seconds = frames / fps
+    sorted_items = [s for s in sorts if s['sorted_at'] is not None]
+    stages = metrics.summary()
+    actuation = stages.get('actuation')
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+    report = {
+        "source": source,
+        "frames": frames,
+        "clip_seconds": round(clip_seconds, 2),
+        "wall_seconds": round(wall, 2),
+        "fps": round(frames / wall, 2) if wall else 0.0,
+        "realtime_factor": round(clip_seconds / wall, 2) if wall else 0.0,
+        "items": len(sorted_items),
+        "items_per_minute": round(len(sorted_items) * 60 / clip_seconds, 2) if clip_seconds else 0.0,
+        # What the mechanism could sustain if items arrived back to back
+        "capacity_items_per_minute": round(60000 / actuation['mean_ms'], 2) if actuation and actuation['mean_ms'] else None,
+        "sorter": sorter.stats(),
+        "decisions": engine.stats(),
+        "servo": planner.stats(),
+        "motion_gate": gate.stats() if gate else None,
+        "stages": stages,
+        "cpu_percent": round(100 * cpu / wall, 1) if wall else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(usage_end.ru_maxrss / 1024, 1),
+        "sorts": sorts,
+    }
+    if truth is not None:
+        report["accuracy"] = score_sorts(sorts, truth, tolerance)
+    return report
+
+
+def print_report(report):
+    print(f"Replayed {report['frames']} frames ({report['clip_seconds']}s of clip) in {report['wall_seconds']}s "
+          f"-> {report['fps']} FPS, {report['realtime_factor']}x real time")
+    print(f"Sorted {report['items']} items ({report['items_per_minute']} items/min, "
+          f"mechanism capacity {report['capacity_items_per_minute']} items/min), sorter {report['sorter']}")
+    print(f"Decisions: {report['decisions']}")
+    if report['motion_gate']:
+        print(f"Motion gate: {report['motion_gate']}")
+    for stage, s in report['stages'].items():
+        print(f"  {stage:<12} mean {s['mean_ms']:8.1f} ms  p50 {s['p50_ms']:8.1f}  p95 {s['p95_ms']:8.1f}  "
+              f"p99 {s['p99_ms']:8.1f}  (n={s['count']})")
+    print(f"CPU {report['cpu_percent']}%  peak RSS {report['peak_rss_mb']} MB")
+    acc = report.get('accuracy')
+    if acc:
+        print(f"Accuracy {acc['accuracy']} ({acc['correct']}/{acc['truth_items']} correct, {acc['wrong']} wrong, "
+              f"{acc['missed']} missed, {acc['extra']} extra)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded clip through the full sort pipeline with simulated servos.')
+    parser.add_argument('--source', help='Video file or image folder to replay', required=True)
+    parser.add_argument('--truth', help='Ground-truth CSV (time,material) to score sorts against', default=None)
+    parser.add_argument('--tolerance', help='Seconds a sort may be from its ground-truth item', type=float, default=2.0)
+    parser.add_argument('--fps', help='Clip frame rate (defaults to the video\'s own, or 30 for image folders)',
+                        type=float, default=None)
+    parser.add_argument('--conf', help='Minimum detection confidence', type=float, default=0.0)
+    parser.add_argument('--servo-speed', help='Calibrated servo speed under load, in degrees per second',
+                        type=float, default=250.0)
+    parser.add_argument('--drop-hold', help='Seconds the drop stays open for the item to fall', type=float, default=0.5)
+    parser.add_argument('--output', help='JSON file for the full report', default=None)
+    for add_args in (add_model_args, add_motion_args, add_decision_args):
+        add_args(parser)
+    args = check_model_args(parser, parser.parse_args(argv))
+
+    try:
+        truth = load_truth(args.truth) if args.truth else None
+        roi = parse_roi(args.roi)
+    except (OSError, KeyError, ValueError) as e:
+        print(f'ERROR: {e}')
+        return 1
+
+    model = load_model(args.model, args.backend, args.precision)
+    clock = SimClock()
+    planner = ServoPlanner(SimulatedServos(clock=clock), speed=args.servo_speed, drop_hold=args.drop_hold,
+                           clock=clock, sleep=clock.sleep)
+    report = run_benchmark(model, args.source, args.fps or clip_fps(args.source), args.imgsz,
+                           engine_from_args(args), planner, clock, gate=gate_from_args(args), roi=roi,
+                           min_conf=args.conf, truth=truth, tolerance=args.tolerance)
+    report["config"] = vars(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Report saved to {args.output}.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# Picamera2 capture without per-frame allocations.
+#
+# The camera is asked for RGB888 (BGR byte order, what OpenCV and the model
+# expect) at the wanted size, so there is no 4-channel frame to convert
+# and no resize. Each frame is copied once, straight out of the camera's
+# DMA buffer into a free slot of a preallocated ring, and the buffer goes
+# back to the camera immediately. A slot only becomes free again when
+# release() hands it back (Pipeline does this through release_fn once a
+# frame is dropped or rendered); with no free slot the new capture is
+# dropped, so a frame still in use is never overwritten.
+
+import threading
+from collections import deque
+
+
+class PicameraSource:
+    """
+    Reads frames from a Pi camera into a ring of preallocated BGR arrays.
+    read() returns a free slot filled with the newest frame; it stays valid
+    until release(frame). Size the ring with Pipeline.frames_in_flight so
+    captures are only dropped when every slot is really in use.
+    """
+
+    def __init__(self, size=(1280, 720), index=0, slots=9, buffer_count=4):
+        import numpy as np
+        from picamera2 import Picamera2
+
+        self.cam = Picamera2(index)
+        config = self.cam.create_video_configuration(main={"format": 'RGB888', "size": tuple(size)},
+                                                     buffer_count=buffer_count)
+        self.cam.configure(config)
+        # libcamera may round the size to what the sensor mode supports
+        width, height = self.cam.camera_configuration()["main"]["size"]
+        self.size = (width, height)
+        self.ring = [np.empty((height, width, 3), np.uint8) for _ in range(slots)]
+        self.dropped = 0
+        self._free = deque(self.ring)
+        self._lock = threading.Lock()
+        self.cam.start()
+
+    def read(self):
+        """
+        Copies the next camera frame into a free slot and returns it (None if
+        capture fails). Frames that arrive while every slot is in use are
+        dropped and counted.
+        """
+        import numpy as np
+        from picamera2 import MappedArray
+
+        while True:
+            request = self.cam.capture_request()
+            if request is None:
+                return None
+            with self._lock:
+                frame = self._free.popleft() if self._free else None
+            if frame is None:
+                request.release()
+                self.dropped += 1
+                continue
+            try:
+                with MappedArray(request, 'main') as mapped:
+                    # The mapped rows can be padded to the buffer stride; copy only the visible pixels
+                    width, height = self.size
+                    np.copyto(frame, mapped.array[:height, :width, :3])
+            except Exception:
+                self.release(frame)
+                raise
+            finally:
+                request.release()
+            return frame
+
+    def release(self, frame):
+        """Gives a frame returned by read() back to the ring. Safe to call from any thread."""
+        with self._lock:
+            self._free.append(frame)
+
+    def close(self):
+        self.cam.stop()
+        self.cam.close()
@@ -0,0 +1,236 @@
+# Shared detection core: material table, model loading and the stream loop.
+# Heavy dependencies (Ultralytics/PyTorch) are only imported when a model is
+# actually loaded, so tools that just need the tables start instantly.
+
+import time
+from collections import namedtuple
+
+from renguard.backends import BACKENDS, PRECISIONS, TRAIN_IMGSZ, check_backend, resolve_model
+from renguard.roi import parse_roi
+
+# Servo action map based on material: (base_angle, drop_angle)
+MATERIAL_ACTIONS = {
+    "Cardboard":  (0, 0),     # 0° base, 0° drop
+    "Plastic":    (0, 120),   # 0° base, 120° drop
+    "Glass":      (60, 0),    # 60° base, 0° drop
+    "Tin":        (60, 120)   # 60° base, 120° drop
+}
+MATERIALS = tuple(MATERIAL_ACTIONS)
+
+# Raw YOLO label prefixes and the material they belong to
+LABEL_PREFIXES = (
+    ("Tin_Can", "Tin"),
+    ("Cardboard", "Cardboard"),
+    ("Plastic", "Plastic"),
+    ("Glass", "Glass"),
+)
+
+DEFAULT_MODEL = 'my_model.pt'
+DEFAULT_IMGSZ = TRAIN_IMGSZ
+
+
+def simplify_label(label):
+    """Simplifies the raw YOLO label to a known material category."""
+    for prefix, material in LABEL_PREFIXES:
+        if label.startswith(prefix):
+            return material
+    return "Unknown"
+
+
+class ClassTable:
+    """
+    Class id -> label/material/action lookup, built once from model.names.
+
+    The prefix matching in simplify_label runs once per class when the
+    table is built, so per-box work is a plain list index.
+    """
+
+    def __init__(self, names):
+        if isinstance(names, dict):
+            size = max(names) + 1 if names else 0
+            labels = [names.get(i, "") for i in range(size)]
+        else:
+            labels = list(names)
+        self.labels = labels
+        self.materials = [simplify_label(label) for label in labels]
+        self.actions = [MATERIAL_ACTIONS.get(m) for m in self.materials]
+
+    def __len__(self):
+        return len(self.labels)
+
+
+# Everything the loop needs from one frame
+Frame = namedtuple('Frame', ['index', 'result', 'labels', 'detections', 'image'])
+
+
+def load_model(model_path=DEFAULT_MODEL, backend="pt", precision="fp32"):
+    """
+    Loads the YOLO model for the chosen backend, importing Ultralytics on
+    first use. Non-pt backends load the exported model next to model_path.
+    """
+    from ultralytics import YOLO
+    return YOLO(resolve_model(model_path, backend, precision), task='detect')
+
+
+def add_model_args(parser, model_default=DEFAULT_MODEL):
+    """Adds the shared --model/--backend/--precision/--imgsz options to a parser."""
+    if model_default is not None:
+        parser.add_argument('--model', help='Path to the trained .pt model', default=model_default)
+    parser.add_argument('--backend', help='Inference backend (export first with python -m renguard.export)',
+                        choices=list(BACKENDS), default='pt')
+    parser.add_argument('--precision', help='Model precision for the chosen backend',
+                        choices=PRECISIONS, default='fp32')
+    parser.add_argument('--imgsz', help='Inference size (defaults to the training resolution)',
+                        type=int, default=DEFAULT_IMGSZ)
+    return parser
+
+
+def build_frame(index, result, image, table, lookup, min_conf=0.0, offset=(0, 0)):
+    """
+    Turns one Ultralytics result into a Frame. lookup is
+    postprocess.material_lookup(table); offset moves boxes from an ROI crop
+    back to full-frame coordinates.
+    """
+    from renguard.postprocess import filter_conf, shift_boxes, to_arrays
+
+    # One device->host conversion per frame, then array ops
+    dets = shift_boxes(filter_conf(to_arrays(result.boxes), min_conf), *offset)
+    ids = lookup[dets.cls]
+    sortable = ids >= 0
+    labels = [table.materials[c] for c in dets.cls.tolist()]
+    detections = list(zip(dets.xyxy[sortable].tolist(),
+                          [MATERIALS[i] for i in ids[sortable].tolist()],
+                          dets.conf[sortable].tolist()))
+    return Frame(index, result, labels, detections, image)
+
+
+def check_model_args(parser, args):
+    """
+    Exits with a usage error if --backend doesn't support --precision or
+    --roi (on parsers that have it) is malformed, before the caller opens
+    any hardware or files. Returns args.
+    """
+    try:
+        check_backend(args.backend, args.precision)
+        parse_roi(getattr(args, 'roi', None))
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def iter_frames(model, table, source=0, imgsz=DEFAULT_IMGSZ, min_conf=0.0, metrics=None, gate=None, roi=None,
+                clock=None):
+    """
+    Runs the model over a stream and yields a Frame per result.
+
+    labels holds the material of every box (including "Unknown") and
+    detections holds (box, material, conf) for sortable materials only,
+    ready for Tracker.update(). image is the full BGR frame, gated or not,
+    for recording.
+
+    With a MotionGate or an roi (fractions x1, y1, x2, y2), frames are
+    grabbed here. Only the ROI crop goes to the model, which letterboxes it
+    straight to imgsz; boxes in detections are mapped back to full-frame
+    coordinates (result itself stays in crop coordinates). The model only
+    runs on frames the gate lets through; the others are yielded as empty
+    frames (result None) so trackers and logs still see time pass. The
+    gate's cooldown runs on clock(frame index) if given (e.g. clip time when
+    replaying a file), otherwise on the wall clock.
+
+    If metrics is given, capture, preprocess, inference and postprocess
+    times are recorded for every frame (time spent by the caller between
+    frames is not counted).
+    """
+    from renguard.postprocess import material_lookup
+
+    lookup = material_lookup(table)
+
+    def to_frame(index, result, image, t_got, post, offset=(0, 0)):
+        frame = build_frame(index, result, image, table, lookup, min_conf, offset)
+        if metrics is not None:
+            metrics.add('postprocess', post + time.perf_counter() - t_got)
+        return frame
+
+    def model_times(result):
+        speed = result.speed or {}
+        return [(speed.get(stage) or 0.0) / 1000 for stage in ('preprocess', 'inference', 'postprocess')]
+
+    if gate is not None or roi is not None:
+        yield from _iter_captured(model, source, imgsz, metrics, gate, roi, to_frame, model_times, clock)
+        return
+
+    t_wait = time.perf_counter()
+    for index, result in enumerate(model(source=source, stream=True, imgsz=imgsz), start=1):
+        t_got = time.perf_counter()
+        pre, inf, post = model_times(result)
+        if metrics is not None:
+            # Whatever the wait was not spent in the model went to grabbing the frame
+            metrics.add('capture', max(0.0, t_got - t_wait - pre - inf - post))
+            metrics.add('preprocess', pre)
+            metrics.add('inference', inf)
+        yield to_frame(index, result, result.orig_img, t_got, post)
+        t_wait = time.perf_counter()
+
+
+def read_frames(source):
+    """
+    Yields BGR frames from a camera index, a video file or a folder of
+    images (in name order), using OpenCV.
+    """
+    import os
+
+    import cv2
+
+    if isinstance(source, str) and os.path.isdir(source):
+        from renguard.batch import list_images
+
+        for path in list_images(source):
+            image = cv2.imread(path)
+            if image is not None:
+                yield image
+        return
+
+    cap = cv2.VideoCapture(source)
+    try:
+        while True:
+            ok, image = cap.read()
+            if not ok:
+                break
+            yield image
+    finally:
+        cap.release()
+
+
+def _iter_captured(model, source, imgsz, metrics, gate, roi, to_frame, model_times, clock=None):
+    # Grabs frames with OpenCV so they can be gated and cropped before the model sees them
+    from renguard.roi import crop
+
+    frames = read_frames(source)
+    try:
+        index = 0
+        while True:
+            t_wait = time.perf_counter()
+            image = next(frames, None)
+            if image is None:
+                break
+            index += 1
+            t_read = time.perf_counter()
+            run = gate is None or gate.check(image, now=clock(index) if clock else None)
+            t_got = time.perf_counter()
+            if metrics is not None:
+                metrics.add('capture', t_read - t_wait)
+                if gate is not None:
+                    metrics.add('gate', t_got - t_read)
+            if not run:
+                yield Frame(index, None, [], [], image)
+                continue
+            region, offset = crop(image, roi)
+            result = model(region, imgsz=imgsz, verbose=False)[0]
+            t_got = time.perf_counter()
+            pre, inf, post = model_times(result)
+            if metrics is not None:
+                metrics.add('preprocess', pre)
+                metrics.add('inference', inf)
+            yield to_frame(index, result, image, t_got, post, offset)
+    finally:
+        frames.close()
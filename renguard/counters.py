@@ -0,0 +1,93 @@
+# Thread-safe material counters shared by the detection thread and Flask.
+#
+# Writers take a lock, build a new dict and publish it as an immutable,
+# versioned snapshot. Readers just grab the current snapshot reference, so
+# they never block and never see a half-applied update. The JSON body for
+# /data is built at most once per version. on_update hears every change
+# while the lock is still held (EventBroadcaster.track uses it to push
+# deltas in the same order they were applied).
+
+import json
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from renguard.core import MATERIALS
+
+# counts is a read-only mapping; a new Snapshot is created on every change
+Snapshot = namedtuple('Snapshot', ['version', 'counts'])
+
+
+class CounterStore:
+    """Versioned material counts with lock-free reads and a cached JSON body."""
+
+    def __init__(self, initial=None, on_update=None):
+        counts = {m: 0 for m in MATERIALS} if initial is None else dict(initial)
+        # Re-entrant so on_update can take it again, e.g. to read a snapshot for a resync
+        self.lock = threading.RLock()
+        self.on_update = on_update
+        self._snapshot = Snapshot(0, MappingProxyType(counts))
+        self._json = (None, b'')
+
+    def _publish(self, counts):
+        # Called with the lock held
+        self._snapshot = Snapshot(self._snapshot.version + 1, MappingProxyType(counts))
+        return self._snapshot
+
+    def increment(self, key, n=1):
+        """Atomically adds n to one counter and returns the new snapshot."""
+        return self.update({key: n})
+
+    def update(self, deltas):
+        """
+        Atomically applies several count changes in one version bump, then
+        calls on_update(deltas) before releasing the lock.
+        """
+        with self.lock:
+            counts = dict(self._snapshot.counts)
+            for key, n in deltas.items():
+                counts[key] = counts.get(key, 0) + n
+            snap = self._publish(counts)
+            if self.on_update is not None:
+                self.on_update(dict(deltas))
+            return snap
+
+    def replace(self, counts):
+        """Atomically replaces all counts."""
+        with self.lock:
+            return self._publish(dict(counts))
+
+    def snapshot(self):
+        """Current immutable snapshot. Never blocks."""
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def json(self, snap=None):
+        """JSON body of the counts (current snapshot by default), regenerated only when the version changes."""
+        snap = snap or self._snapshot
+        version, body = self._json
+        if version != snap.version:
+            body = json.dumps(dict(snap.counts), separators=(',', ':')).encode()
+            # Tuple assignment is atomic; concurrent readers at worst build it twice
+            if snap is self._snapshot:
+                self._json = (snap.version, body)
+        return body
+
+    def to_dict(self):
+        return dict(self._snapshot.counts)
+
+
+def json_response(store):
+    """
+    Flask response for the store's counts with the version as ETag, so
+    dashboards polling an unchanged store get a cheap 304.
+    """
+    from flask import Response, request
+
+    snap = store.snapshot()
+    response = Response(store.json(snap), mimetype='application/json')
+    response.set_etag(str(snap.version))
+    return response.make_conditional(request)
@@ -0,0 +1,118 @@
+# Temporal voting: decide what a tracked item is before moving the servos.
+#
+# A wrong sort costs a full servo cycle plus a manual re-sort, so one
+# misclassified frame must not be enough to commit. Each track collects
+# confidence-weighted votes over a sliding window of its last frames. The
+# decision is committed as soon as the winning material is stable enough,
+# or when the item has been in view for too long and has to be sorted now.
+
+import time
+from collections import Counter, deque, namedtuple
+
+# One committed sort decision. id/material/score match tracker.Track, so a
+# Decision can be logged with DetectionLog.write_item().
+Decision = namedtuple('Decision', ['id', 'material', 'score', 'frames', 'latency', 'reason'])
+
+
+class DecisionEngine:
+    """
+    Commits one Decision per track.
+
+    A track is decided as 'stable' once it has at least min_votes frames in
+    its window and the winning material holds at least min_share of the
+    window's confidence. If that never happens, it is decided anyway after
+    deadline seconds ('deadline') with whichever material leads, as long as
+    it was seen in at least deadline_votes frames (a one-frame false
+    positive is never sorted). Tracks that disappear before either are
+    dropped and counted as expired.
+    """
+
+    def __init__(self, window=8, min_votes=3, min_share=0.7, deadline=1.5, deadline_votes=2, metrics=None):
+        self.window = window
+        self.min_votes = min_votes
+        self.deadline_votes = deadline_votes
+        self.min_share = min_share
+        self.deadline = deadline
+        self.metrics = metrics
+        self.history = {}
+        self.first_seen = {}
+        self.decided = set()
+        self.counts = Counter()
+
+    def update(self, detections, track_ids, active_ids, now=None):
+        """
+        detections: the (box, material, conf) list given to Tracker.update(),
+        track_ids: its tracker.detection_ids, active_ids: ids of the tracks
+        the tracker still holds. Returns the Decisions committed on this frame.
+        """
+        now = time.monotonic() if now is None else now
+        for (_, material, conf), track_id in zip(detections, track_ids):
+            if track_id is None or track_id in self.decided:
+                continue
+            if track_id not in self.history:
+                self.history[track_id] = deque(maxlen=self.window)
+                self.first_seen[track_id] = now
+            self.history[track_id].append((material, conf))
+
+        decisions = []
+        for track_id in list(self.history):
+            if track_id not in active_ids:
+                # Lost before a decision was reached
+                self._forget(track_id)
+                self.counts['expired'] += 1
+                continue
+            decision = self._decide(track_id, now)
+            if decision is not None:
+                decisions.append(decision)
+
+        # Decided tracks only need remembering while the tracker still follows them
+        self.decided &= set(active_ids)
+        return decisions
+
+    def _decide(self, track_id, now):
+        votes = Counter()
+        for material, conf in self.history[track_id]:
+            votes[material] += conf
+        material, support = votes.most_common(1)[0]
+        total = sum(votes.values())
+        share = support / total if total else 0.0
+        latency = now - self.first_seen[track_id]
+        frames = len(self.history[track_id])
+        if frames >= self.min_votes and share >= self.min_share:
+            reason = 'stable'
+        elif latency >= self.deadline and frames >= self.deadline_votes:
+            reason = 'deadline'
+        else:
+            return None
+
+        self._forget(track_id)
+        self.decided.add(track_id)
+        self.counts[reason] += 1
+        if self.metrics is not None:
+            self.metrics.add('decision', latency)
+        return Decision(track_id, material, share, frames, latency, reason)
+
+    def _forget(self, track_id):
+        del self.history[track_id]
+        del self.first_seen[track_id]
+
+    def stats(self):
+        """Decisions by reason ('stable', 'deadline') and tracks lost undecided ('expired')."""
+        return {"stable": self.counts['stable'], "deadline": self.counts['deadline'],
+                "expired": self.counts['expired'], "pending": len(self.history)}
+
+
+def add_decision_args(parser):
+    """Adds the shared --vote-window/--vote-share/--decision-deadline options to a parser."""
+    parser.add_argument('--vote-window', help='Frames of votes kept per tracked item', type=int, default=8)
+    parser.add_argument('--vote-share', help='Share of the confidence-weighted votes the winning material needs before sorting',
+                        type=float, default=0.7)
+    parser.add_argument('--decision-deadline', help='Seconds after an item appears by which it is sorted anyway',
+                        type=float, default=1.5)
+    return parser
+
+
+def engine_from_args(args, metrics=None):
+    """Builds the DecisionEngine configured on the command line."""
+    return DecisionEngine(window=args.vote_window, min_share=args.vote_share,
+                          deadline=args.decision_deadline, metrics=metrics)
@@ -0,0 +1,181 @@
+# Streaming, append-only detection log (detected.txt).
+#
+# Records are written as they happen instead of being held in memory until
+# Ctrl+C, so memory stays flat on long runs and a crash loses at most one
+# flush interval. Runs of empty frames are run-length encoded.
+#
+# One tab-separated record per line:
+#   D  <time> <frame> <track> <material> <conf>   one detection
+#   E  <time> <first frame> <count>               run of empty frames
+#   I  <time> <frame> <track> <material> <score>  new item (one per sort event)
+#   S  <time> <material> <count>                  item totals, written on close
+# Lines starting with '#' are comments. Older "Frame N: a, b" lines are
+# still understood by the parser.
+
+import os
+import re
+import time
+from collections import Counter
+
+HEADER = "# Ren-Guard detection log: D=detection E=empty frames I=item S=summary\n"
+
+_LEGACY_FRAME = re.compile(r"Frame (\d+): (.*)")
+
+
+class DetectionLog:
+    """
+    Appends detection records to path, flushing every flush_interval
+    seconds and rotating to path.1 ... path.<backups> once the file grows
+    past max_bytes. Item and detection totals are kept incrementally.
+    """
+
+    def __init__(self, path='detected.txt', flush_interval=1.0, max_bytes=5_000_000, backups=3):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.item_counts = Counter()
+        self.detection_counts = Counter()
+        self.frames = 0
+        self._empty_start = None
+        self._empty_count = 0
+        self._last_flush = time.monotonic()
+        self._file = None
+        self._open()
+
+    def _open(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if new_file:
+            self._file.write(HEADER)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _write(self, line):
+        self._file.write(line)
+
+    def _maybe_flush(self, force=False):
+        # Checked on every frame, empty ones included, so records never sit in the buffer for long
+        now = time.monotonic()
+        if force or now - self._last_flush >= self.flush_interval:
+            self.flush()
+            self._last_flush = now
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _end_empty_run(self):
+        if self._empty_count:
+            self._write(f"E\t{time.time():.3f}\t{self._empty_start}\t{self._empty_count}\n")
+            self._empty_start = None
+            self._empty_count = 0
+
+    def write_frame(self, frame_index, detections, track_ids=None):
+        """
+        Logs one frame. detections is a list of (box, material, conf);
+        track_ids, if given, holds the track id of each detection.
+        """
+        self.frames += 1
+        if not detections:
+            if self._empty_start is None:
+                self._empty_start = frame_index
+            self._empty_count += 1
+            self._maybe_flush()
+            return
+
+        self._end_empty_run()
+        now = f"{time.time():.3f}"
+        for i, (_, material, conf) in enumerate(detections):
+            track = track_ids[i] if track_ids and track_ids[i] is not None else '-'
+            self.detection_counts[material] += 1
+            self._write(f"D\t{now}\t{frame_index}\t{track}\t{material}\t{conf:.3f}\n")
+        self._maybe_flush()
+
+    def write_item(self, frame_index, track):
+        """Logs a newly sorted item (a tracker.Track or decision.Decision) and counts it."""
+        self._end_empty_run()
+        self.item_counts[track.material] += 1
+        self._write(f"I\t{time.time():.3f}\t{frame_index}\t{track.id}\t{track.material}\t{track.score:.3f}\n")
+        # Sort events go out at once, for --follow uploaders and in case of a crash
+        self._maybe_flush(force=True)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        """Writes the item totals and closes the file."""
+        if self._file is None:
+            return
+        self._end_empty_run()
+        now = f"{time.time():.3f}"
+        for material, count in self.item_counts.items():
+            self._file.write(f"S\t{now}\t{material}\t{count}\n")
+        self._file.close()
+        self._file = None
+
+
+def parse_line(line):
+    """
+    Parses one log line into a tuple, or None for comments/unknown lines:
+      ('D', time, frame, track, material, conf)
+      ('E', time, first_frame, count)
+      ('I', time, frame, track, material, score)
+      ('S', time, material, count)
+      ('F', frame, [materials])  for legacy "Frame N: a, b" lines
+    """
+    fields = line.rstrip('\n').split('\t')
+    kind = fields[0]
+    try:
+        if kind in ('D', 'I') and len(fields) == 6:
+            track = None if fields[3] == '-' else int(fields[3])
+            return (kind, float(fields[1]), int(fields[2]), track, fields[4], float(fields[5]))
+        if kind == 'E' and len(fields) == 4:
+            return (kind, float(fields[1]), int(fields[2]), int(fields[3]))
+        if kind == 'S' and len(fields) == 4:
+            return (kind, float(fields[1]), fields[2], int(fields[3]))
+    except ValueError:
+        return None
+    match = _LEGACY_FRAME.match(line)
+    if match:
+        materials = [m.strip() for m in match.group(2).split(',') if m.strip()]
+        return ('F', int(match.group(1)), materials)
+    return None
+
+
+def iter_frame_materials(lines):
+    """
+    Rebuilds (frame, [materials]) per frame from log lines, in order.
+    Empty runs yield one empty frame, which is all the de-duplication in
+    sendtv needs to see a break between items.
+    """
+    current, materials = None, []
+    for line in lines:
+        record = parse_line(line)
+        if record is None:
+            continue
+        kind = record[0]
+        if kind == 'D':
+            if record[2] != current:
+                if current is not None:
+                    yield current, materials
+                current, materials = record[2], []
+            materials.append(record[4])
+            continue
+        if current is not None:
+            yield current, materials
+            current, materials = None, []
+        if kind == 'E':
+            yield record[2], []
+        elif kind == 'F':
+            yield record[1], record[2]
+    if current is not None:
+        yield current, materials
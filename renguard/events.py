@@ -0,0 +1,117 @@
+# Server-Sent Events fan-out for live dashboards.
+#
+# publish() serializes each event once and hands the same bytes to every
+# connected dashboard. Each subscriber has a small bounded queue; a client
+# that stops reading doesn't slow the detector down. Running totals are
+# built from "delta" events, so a dropped one would leave a dashboard wrong
+# for good: with resync set, a client whose queue fills up has it replaced
+# by a fresh snapshot of the state instead, and new clients get the same
+# snapshot when they connect.
+
+import json
+import queue
+import threading
+
+
+def format_sse(event, data):
+    """Formats one SSE message."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class EventBroadcaster:
+    """
+    Fans events out to any number of SSE clients. resync() returns the
+    (event, data) pairs that bring a client fully up to date; sync_lock,
+    held by whoever changes that state while they publish the change, makes
+    sure a client never gets a change both in its snapshot and as an event.
+    """
+
+    def __init__(self, queue_size=100, heartbeat=15.0, resync=None, sync_lock=None):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.resync = resync
+        self.sync_lock = sync_lock or threading.RLock()
+        self.resyncs = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def track(self, store):
+        """
+        Keeps dashboards in step with a counters.CounterStore: every update
+        is published as a "delta" event, and clients (re)sync from a
+        "counts" event with the store's totals. Returns self.
+        """
+        self.resync = lambda: [("counts", store.to_dict())]
+        self.sync_lock = store.lock
+        store.on_update = lambda delta: self.publish("delta", delta)
+        return self
+
+    def publish(self, event, data):
+        message = format_sse(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                self._overflow(q, message)
+
+    def _overflow(self, q, message):
+        if self.resync is None:
+            # Slow client: drop its oldest event
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(message)
+                    return
+                except queue.Full:
+                    continue
+        # Slow client: replace everything it hasn't read with a fresh snapshot (it covers any delta in message)
+        with self.sync_lock:
+            messages = [format_sse(e, d) for e, d in self.resync()]
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+            for m in messages[:self.queue_size]:
+                q.put_nowait(m)
+            self.resyncs += 1
+
+    def subscribe(self):
+        """Adds a client queue. Returns (queue, messages of its initial resync)."""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self.sync_lock:
+            # Under sync_lock, so each change is either in the snapshot or in the queue
+            initial = [format_sse(e, d) for e, d in self.resync()] if self.resync else []
+            with self._lock:
+                self._subscribers.add(q)
+        return q, initial
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self):
+        """
+        Generator for a Flask streaming response: the resync snapshot (e.g.
+        the current totals), then every event as it is published.
+        """
+        q, initial = self.subscribe()
+        try:
+            yield from initial
+            while True:
+                try:
+                    yield q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # Comment line keeps proxies and the browser from timing out
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(q)
@@ -0,0 +1,396 @@
+# Evidence archive: the frame behind every sort decision, for audits.
+#
+# Each committed sort saves a JPEG of the ROI the model looked at plus a
+# small thumbnail, appended to the current chunk file (chunk-000001.bin,
+# ...). Chunks are only ever appended to, and are rolled over once they
+# reach chunk_bytes. An SQLite index (WAL mode, like history.db) holds
+# the metadata and the byte offsets, so a time range or a material is
+# looked up without touching the images, and an image is read with one
+# seek. Disk usage is bounded by deleting whole chunks, oldest first,
+# once the archive is over max_bytes or a chunk is older than max_age; the
+# chunk being appended to is never deleted. Ids are never reused, so an id
+# always refers to the same image and server.py lets browsers cache it.
+#
+# Encoding and writing happen on a background thread (EvidenceWriter), so
+# the detection loop only pays for queueing the frame.
+
+import hashlib
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+
+from renguard.roi import crop
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evidence (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    device TEXT NOT NULL,
+    material TEXT NOT NULL,
+    conf REAL,
+    score REAL,
+    reason TEXT,
+    item INTEGER,
+    frame INTEGER,
+    box TEXT,
+    crop TEXT,
+    model TEXT,
+    chunk INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    thumb_offset INTEGER NOT NULL,
+    thumb_length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evidence_ts ON evidence (ts);
+CREATE INDEX IF NOT EXISTS evidence_material_ts ON evidence (material, ts);
+CREATE INDEX IF NOT EXISTS evidence_chunk ON evidence (chunk);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Archives written before ids were AUTOINCREMENT get their tables rebuilt once
+MIGRATE_PRE = """
+DROP INDEX IF EXISTS evidence_ts;
+DROP INDEX IF EXISTS evidence_material_ts;
+DROP INDEX IF EXISTS evidence_chunk;
+ALTER TABLE evidence RENAME TO evidence_old;
+ALTER TABLE chunks RENAME TO chunks_old;
+"""
+MIGRATE_POST = """
+INSERT INTO chunks SELECT * FROM chunks_old;
+INSERT INTO evidence SELECT * FROM evidence_old;
+DROP TABLE evidence_old;
+DROP TABLE chunks_old;
+"""
+
+COLUMNS = ['id', 'time', 'device', 'material', 'conf', 'score', 'reason', 'item', 'frame', 'box', 'crop', 'model']
+
+
+def model_version(path):
+    """
+    Short content hash of a model file or exported model folder, so each
+    piece of evidence records exactly which weights made the decision.
+    """
+    digest = hashlib.sha1()
+    if os.path.isdir(path):
+        files = sorted(os.path.join(d, f) for d, _, names in os.walk(path) for f in names)
+    else:
+        files = [path]
+    for name in files:
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return f"{os.path.basename(os.path.normpath(path))}@{digest.hexdigest()[:12]}"
+
+
+def locate(decision, detections, track_ids, tracks):
+    """
+    Box and confidence of a decided item on this frame. Items decided on
+    their deadline may not be detected on this frame; those get the box the
+    tracker last saw and no confidence.
+    """
+    for (box, _, conf), track_id in zip(detections, track_ids):
+        if track_id == decision.id:
+            return box, conf
+    for track in tracks:
+        if track.id == decision.id:
+            return track.box, None
+    return None, None
+
+
+class EvidenceArchive:
+    """
+    Append-only chunked image store with an SQLite index. One process
+    writes (the detector); any number can read (server.py). Writes go
+    through a single connection under a lock; each reading thread gets its
+    own connection. With readonly=True (for readers) nothing is created or
+    migrated: the index is opened with SQLite's mode=ro, and until a
+    detector has created it the archive reads as empty.
+    """
+
+    def __init__(self, root='evidence', device=None, model=None, chunk_bytes=16 << 20, max_bytes=500 << 20,
+                 max_age=30 * 86400, quality=85, thumb_width=160, readonly=False):
+        if max_bytes is not None and max_bytes < chunk_bytes:
+            raise ValueError(f"Evidence max_bytes ({max_bytes}) must be at least chunk_bytes ({chunk_bytes})")
+        self.root = root
+        self.device = device or socket.gethostname()
+        self.model = model
+        self.chunk_bytes = chunk_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.quality = quality
+        self.thumb_width = thumb_width
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = None
+        if readonly:
+            return
+        os.makedirs(root, exist_ok=True)
+        self._writer = self._connect()
+        old = self._writer.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'evidence'").fetchone()
+        if old and 'AUTOINCREMENT' not in old[0]:
+            self._writer.executescript('BEGIN;' + MIGRATE_PRE + SCHEMA + MIGRATE_POST + 'COMMIT;')
+        self._writer.executescript(SCHEMA)
+
+    def _connect(self):
+        path = os.path.join(self.root, 'index.db')
+        if self.readonly:
+            return sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True, check_same_thread=False)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _reader(self):
+        """This thread's connection, or None while a read-only archive has no index yet."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.readonly and not os.path.exists(os.path.join(self.root, 'index.db')):
+                return None
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _chunk_path(self, chunk):
+        return os.path.join(self.root, f'chunk-{chunk:06d}.bin')
+
+    def _encode(self, image):
+        import cv2
+
+        ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError('Could not encode evidence image')
+        h, w = image.shape[:2]
+        if w > self.thumb_width:
+            image = cv2.resize(image, (self.thumb_width, max(1, round(h * self.thumb_width / w))),
+                               interpolation=cv2.INTER_AREA)
+        ok, thumb = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        if not ok:
+            raise ValueError('Could not encode evidence thumbnail')
+        return jpeg.tobytes(), thumb.tobytes()
+
+    def add(self, image, material, box=None, conf=None, roi=None, score=None, reason=None, item=None, frame=None,
+            ts=None, device=None):
+        """
+        Saves the ROI crop of a full BGR frame with its metadata. box is in
+        full-frame coordinates; the crop's offset and size are stored with it
+        so the box can be drawn on the crop. device defaults to the archive's.
+        Returns the evidence id.
+        """
+        if self.readonly:
+            raise ValueError(f"Evidence archive {self.root} is open read-only")
+        ts = time.time() if ts is None else ts
+        region, (x, y) = crop(image, roi)
+        h, w = region.shape[:2]
+        jpeg, thumb = self._encode(region)
+
+        with self._lock, self._writer as conn:
+            row = conn.execute('SELECT id, bytes, created FROM chunks ORDER BY id DESC LIMIT 1').fetchone()
+            # A full chunk, or one old enough to expire, is closed so eviction can take it
+            if row is None or row[1] >= self.chunk_bytes or (self.max_age is not None and ts - row[2] > self.max_age):
+                chunk = conn.execute('INSERT INTO chunks (created, last_ts) VALUES (?, ?)', (ts, ts)).lastrowid
+            else:
+                chunk = row[0]
+            with open(self._chunk_path(chunk), 'ab') as f:
+                offset = f.tell()
+                f.write(jpeg)
+                f.write(thumb)
+            conn.execute('UPDATE chunks SET bytes = bytes + ?, last_ts = MAX(last_ts, ?) WHERE id = ?',
+                         (len(jpeg) + len(thumb), ts, chunk))
+            evidence_id = conn.execute(
+                'INSERT INTO evidence (ts, device, material, conf, score, reason, item, frame, box, crop, model, '
+                'chunk, offset, length, thumb_offset, thumb_length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (ts, device or self.device, material, conf, score, reason, item, frame,
+                 json.dumps([round(v, 1) for v in box]) if box is not None else None, json.dumps([x, y, w, h]),
+                 self.model, chunk, offset, len(jpeg), offset + len(jpeg), len(thumb))).lastrowid
+        self.evict(now=ts)
+        return evidence_id
+
+    def evict(self, now=None):
+        """
+        Deletes the oldest chunks until the archive is within max_bytes and
+        max_age, never the chunk being appended to. Returns how many went.
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        if self.readonly:
+            return removed
+        with self._lock:
+            while True:
+                with self._writer as conn:
+                    total = conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM chunks').fetchone()[0]
+                    oldest = conn.execute('SELECT id, last_ts FROM chunks WHERE id < (SELECT MAX(id) FROM chunks) '
+                                          'ORDER BY id LIMIT 1').fetchone()
+                    if oldest is None:
+                        break
+                    chunk, last_ts = oldest
+                    too_big = self.max_bytes is not None and total > self.max_bytes
+                    too_old = self.max_age is not None and now - last_ts > self.max_age
+                    if not (too_big or too_old):
+                        break
+                    # Index rows go first, so a reader never finds a row whose chunk is gone
+                    conn.execute('DELETE FROM evidence WHERE chunk = ?', (chunk,))
+                    conn.execute('DELETE FROM chunks WHERE id = ?', (chunk,))
+                try:
+                    os.remove(self._chunk_path(chunk))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+        return removed
+
+    def query(self, start=None, end=None, material=None, device=None, limit=100):
+        """Evidence metadata between start and end (epoch seconds), newest first."""
+        where, params = [], []
+        if start is not None:
+            where.append('ts >= ?')
+            params.append(start)
+        if end is not None:
+            where.append('ts < ?')
+            params.append(end)
+        if material is not None:
+            where.append('material = ?')
+            params.append(material)
+        if device is not None:
+            where.append('device = ?')
+            params.append(device)
+        sql = 'SELECT id, ts, device, material, conf, score, reason, item, frame, box, crop, model FROM evidence'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY ts DESC LIMIT ?'
+        params.append(limit)
+        rows = []
+        conn = self._reader()
+        if conn is None:
+            return rows
+        for row in conn.execute(sql, params):
+            entry = dict(zip(COLUMNS, row))
+            entry['box'] = json.loads(entry['box']) if entry['box'] else None
+            entry['crop'] = json.loads(entry['crop'])
+            rows.append(entry)
+        return rows
+
+    def read(self, evidence_id, thumb=False):
+        """JPEG bytes of one piece of evidence (or its thumbnail), or None if it is not in the archive."""
+        column = 'thumb_offset, thumb_length' if thumb else 'offset, length'
+        conn = self._reader()
+        if conn is None:
+            return None
+        row = conn.execute(f'SELECT chunk, {column} FROM evidence WHERE id = ?', (evidence_id,)).fetchone()
+        if row is None:
+            return None
+        chunk, offset, length = row
+        try:
+            with open(self._chunk_path(chunk), 'rb') as f:
+                f.seek(offset)
+                data = f.read(length)
+        except FileNotFoundError:
+            # Evicted between the lookup and the read
+            return None
+        return data if len(data) == length else None
+
+    def stats(self):
+        """Number of pieces of evidence, chunks and bytes on disk."""
+        conn = self._reader()
+        if conn is None:
+            return {"items": 0, "chunks": 0, "bytes": 0}
+        items = conn.execute('SELECT COUNT(*) FROM evidence').fetchone()[0]
+        chunks, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM chunks').fetchone()
+        return {"items": items, "chunks": chunks, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+
+
+class EvidenceWriter:
+    """
+    Saves evidence to an EvidenceArchive on a background thread, so JPEG
+    encoding, the index commit and eviction never hold up inference. The
+    queue is bounded; if the disk can't keep up, new evidence is dropped and
+    counted rather than blocking the detection loop.
+    """
+
+    def __init__(self, archive, maxsize=32):
+        self.archive = archive
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.saved = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name='evidence', daemon=True)
+        self._thread.start()
+
+    def add_decision(self, frame, decision, tracker, roi=None, device=None):
+        """
+        Queues the evidence for a Decision committed on frame (a core.Frame).
+        The box is looked up now, while the tracker still matches this frame.
+        frame.image must not be drawn on afterwards. Returns False if dropped.
+        """
+        box, conf = locate(decision, frame.detections, tracker.detection_ids, tracker.tracks)
+        job = (frame.image, decision.material,
+               dict(box=box, conf=conf, roi=roi, score=decision.score, reason=decision.reason, item=decision.id,
+                    frame=frame.index, ts=time.time(), device=device))
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self.dropped += 1
+            print(f"Evidence writer busy, dropped evidence for item {decision.id}")
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            image, material, fields = job
+            try:
+                self.archive.add(image, material, **fields)
+                self.saved += 1
+            except (OSError, ValueError, sqlite3.Error) as e:
+                # A full disk or a bad frame is reported but never stops sorting
+                self.failed += 1
+                print(f"Could not save evidence for item {fields['item']}: {e}")
+
+    def stats(self):
+        return {"saved": self.saved, "dropped": self.dropped, "failed": self.failed, "queued": self.jobs.qsize()}
+
+    def close(self):
+        """Saves whatever is still queued, then closes the archive."""
+        self.jobs.put(None)
+        self._thread.join()
+        self.archive.close()
+
+
+def add_evidence_args(parser):
+    """Adds the shared --evidence/--evidence-max-mb/--evidence-max-days options to a parser."""
+    parser.add_argument('--evidence', help='Folder for the image behind every sort decision ("" to turn off)',
+                        default='evidence')
+    parser.add_argument('--evidence-max-mb', help='Disk space the evidence may use before the oldest is deleted',
+                        type=float, default=500)
+    parser.add_argument('--evidence-max-days', help='Days evidence is kept', type=float, default=30)
+    return parser
+
+
+def archive_from_args(args, device=None):
+    """Builds the background EvidenceWriter configured on the command line, or None with --evidence ""."""
+    if not args.evidence:
+        return None
+    from renguard.backends import resolve_model
+
+    max_bytes = int(args.evidence_max_mb * (1 << 20))
+    # Small budgets get smaller chunks, so eviction still keeps most of the budget in use
+    archive = EvidenceArchive(args.evidence, device=device,
+                              model=model_version(resolve_model(args.model, args.backend, args.precision)),
+                              chunk_bytes=max(1, min(16 << 20, max_bytes // 4)), max_bytes=max_bytes,
+                              max_age=args.evidence_max_days * 86400)
+    return EvidenceWriter(archive)
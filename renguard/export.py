@@ -0,0 +1,34 @@
+# Export (and optionally INT8-calibrate) the sorting model for a faster backend.
+#
+# Example:
+#   python -m renguard.export --model my_model.pt --backend ncnn --precision fp16
+#   python -m renguard.export --model my_model.pt --backend openvino --precision int8 --calib calib_images
+
+import argparse
+import sys
+
+from renguard.backends import BACKENDS, PRECISIONS, TRAIN_IMGSZ, export_model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the YOLO model for a Pi-friendly inference backend.')
+    parser.add_argument('--model', help='Path to the trained .pt model', default='my_model.pt')
+    parser.add_argument('--backend', help='Target backend', choices=[b for b in BACKENDS if b != 'pt'], required=True)
+    parser.add_argument('--precision', help='Target precision', choices=PRECISIONS, default='fp32')
+    parser.add_argument('--imgsz', help='Model input size (defaults to the training resolution)', type=int, default=TRAIN_IMGSZ)
+    parser.add_argument('--calib', help='Folder of representative images for INT8 calibration', default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        path = export_model(args.model, args.backend, args.precision, imgsz=args.imgsz, calib_dir=args.calib)
+    except (ValueError, FileNotFoundError) as e:
+        print(f'ERROR: {e}')
+        return 1
+
+    print(f'Exported {args.model} -> {path}')
+    print(f'Run with: --backend {args.backend} --precision {args.precision}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# Incremental reader for the detection log.
+#
+# LogFollower remembers how far into detected.txt it has read (byte offset
+# and inode, persisted to a small JSON state file) so each call only parses
+# lines appended since the last one, and it follows the log across
+# DetectionLog's size-based rotation.
+
+import json
+import os
+
+from renguard.eventlog import parse_line
+
+
+class LogFollower:
+    """
+    Reads complete new lines from path, starting where the previous run
+    stopped. Extra caller state (e.g. de-duplication state) can be stored
+    in self.state and is saved along with the offset.
+    """
+
+    def __init__(self, path='detected.txt', state_path=None):
+        self.path = path
+        self.state_path = state_path or f"{path}.state"
+        self.offset = 0
+        self.inode = None
+        self.state = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        self.offset = saved.get("offset", 0)
+        self.inode = saved.get("inode")
+        self.state = saved.get("state", {})
+
+    def save(self):
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"offset": self.offset, "inode": self.inode, "state": self.state}, f)
+        os.replace(tmp, self.state_path)
+
+    def _read_from(self, path, offset):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        # Only hand out complete lines; a partial last line is read next time
+        end = data.rfind(b'\n') + 1
+        return data[:end].decode('utf-8', errors='replace').splitlines(keepends=True), offset + end
+
+    def _hold_back_last_frame(self, lines, offset):
+        """
+        Leaves the trailing detection records of the newest frame unread, in
+        case the writer flushed in the middle of that frame.
+        """
+        keep = len(lines)
+        last_frame = None
+        while keep > 0:
+            record = parse_line(lines[keep - 1])
+            if record is None or record[0] != 'D' or (last_frame is not None and record[2] != last_frame):
+                break
+            last_frame = record[2]
+            keep -= 1
+        if keep == len(lines):
+            return lines, offset
+        held = sum(len(line.encode('utf-8')) for line in lines[keep:])
+        return lines[:keep], offset - held
+
+    def poll(self):
+        """Returns the list of new complete lines since the last poll."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+
+        lines = []
+        if self.inode is not None and st.st_ino != self.inode:
+            # The log was rotated: finish the old file first if it is still around
+            rotated = f"{self.path}.1"
+            if os.path.exists(rotated) and os.stat(rotated).st_ino == self.inode:
+                old_lines, _ = self._read_from(rotated, self.offset)
+                lines.extend(old_lines)
+            self.offset = 0
+        elif st.st_size < self.offset:
+            # Truncated or replaced in place: start over
+            self.offset = 0
+        self.inode = st.st_ino
+
+        new_lines, offset = self._read_from(self.path, self.offset)
+        new_lines, self.offset = self._hold_back_last_frame(new_lines, offset)
+        lines.extend(new_lines)
+        return lines
@@ -0,0 +1,188 @@
+# Persistent sort history for server.py.
+#
+# Every sort event is appended to an SQLite database in WAL mode, so the
+# web server can keep answering reads while a batch is being written. Each
+# write also bumps pre-aggregated hourly and daily rollup rows in the same
+# transaction, so totals and history charts are read from a few hundred
+# rollup rows instead of scanning months of raw events.
+
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+# Rollup bucket sizes in seconds (UTC)
+INTERVALS = {'hour': 3600, 'day': 86400}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    device TEXT NOT NULL,
+    material TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 1,
+    item INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_device_material_ts ON events (device, material, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    interval TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    device TEXT NOT NULL,
+    material TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (interval, start, device, material)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS devices (
+    device TEXT PRIMARY KEY,
+    last_seq INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL,
+    stream INTEGER
+);
+"""
+
+GROUP_COLUMNS = {'material': ['material'], 'device': ['device'], 'both': ['device', 'material']}
+
+
+class HistoryStore:
+    """
+    Sort events and hourly/daily rollups in one SQLite file. Writes go
+    through a single connection under a lock; each reading thread gets its
+    own connection so reads never wait on a write.
+    """
+
+    def __init__(self, path='history.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        columns = [row[1] for row in self._writer.execute('PRAGMA table_info(devices)')]
+        if 'stream' not in columns:
+            # history.db files from before outbox streams
+            with self._writer as conn:
+                conn.execute('ALTER TABLE devices ADD COLUMN stream INTEGER')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL keeps the database consistent on a crash; NORMAL only risks the last commits on power loss
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def record(self, device, rows, last_seq=None, stream=None):
+        """
+        Stores rows of (ts, material, count, item) for one device in a single
+        transaction, updating the rollups and the device's last applied seq.
+        A new stream (the device started a new outbox) replaces last_seq
+        instead of only raising it.
+        """
+        rollup = Counter()
+        for ts, material, count, _ in rows:
+            for interval, size in INTERVALS.items():
+                rollup[(interval, int(ts // size * size), material)] += count
+
+        with self._lock, self._writer as conn:
+            conn.executemany('INSERT INTO events (ts, device, material, count, item) VALUES (?, ?, ?, ?, ?)',
+                             [(ts, device, material, count, item) for ts, material, count, item in rows])
+            conn.executemany('INSERT INTO rollups (interval, start, device, material, count) VALUES (?, ?, ?, ?, ?) '
+                             'ON CONFLICT (interval, start, device, material) DO UPDATE SET count = count + excluded.count',
+                             [(interval, start, device, material, n) for (interval, start, material), n in rollup.items()])
+            conn.execute('INSERT INTO devices (device, last_seq, last_seen, stream) VALUES (?, ?, ?, ?) '
+                         'ON CONFLICT (device) DO UPDATE SET '
+                         'last_seq = CASE WHEN excluded.stream IS NULL OR excluded.stream IS stream '
+                         'THEN MAX(last_seq, excluded.last_seq) ELSE excluded.last_seq END, '
+                         'stream = COALESCE(excluded.stream, stream), last_seen = excluded.last_seen',
+                         (device, last_seq or 0, time.time(), stream))
+
+    def record_ingest(self, device, delta, events, last_seq=None, stream=None):
+        """
+        Stores the result of one IngestLedger.apply(). Sort events keep their
+        own timestamps; counts that arrived as plain deltas are stamped now.
+        """
+        rows = [(e.get('time') or time.time(), e['material'], 1, e.get('item')) for e in events]
+        remaining = Counter(delta)
+        remaining.subtract(e['material'] for e in events)
+        now = time.time()
+        rows.extend((now, material, n, None) for material, n in remaining.items() if n)
+        if rows:
+            self.record(device, rows, last_seq, stream)
+
+    def totals(self, device=None):
+        """All-time counts per material, from the daily rollups."""
+        sql = 'SELECT material, SUM(count) FROM rollups WHERE interval = ?'
+        params = ['day']
+        if device is not None:
+            sql += ' AND device = ?'
+            params.append(device)
+        return dict(self._reader().execute(sql + ' GROUP BY material', params).fetchall())
+
+    def devices(self):
+        """
+        Per-device state for restoring an IngestLedger after a restart:
+        {device: {"counts": {...}, "stream": id, "last_seq": n, "last_seen": ts}}.
+        """
+        conn = self._reader()
+        result = {device: {"counts": {}, "stream": stream, "last_seq": last_seq, "last_seen": last_seen}
+                  for device, last_seq, last_seen, stream
+                  in conn.execute('SELECT device, last_seq, last_seen, stream FROM devices')}
+        for device, material, count in conn.execute("SELECT device, material, SUM(count) FROM rollups "
+                                                    "WHERE interval = 'day' GROUP BY device, material"):
+            result.setdefault(device, {"counts": {}, "stream": None, "last_seq": 0,
+                                       "last_seen": None})["counts"][material] = count
+        return result
+
+    def series(self, interval='hour', start=None, end=None, device=None, material=None, group_by='material'):
+        """
+        Counts per interval bucket between start and end (epoch seconds),
+        grouped by material, device or both. Returns a list of dicts sorted
+        by bucket start.
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown interval '{interval}'. Choose from: {', '.join(INTERVALS)}")
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Unknown group_by '{group_by}'. Choose from: {', '.join(GROUP_COLUMNS)}")
+
+        size = INTERVALS[interval]
+        where, params = ['interval = ?'], [interval]
+        if start is not None:
+            where.append('start >= ?')
+            params.append(int(start // size * size))
+        if end is not None:
+            where.append('start < ?')
+            params.append(end)
+        if device is not None:
+            where.append('device = ?')
+            params.append(device)
+        if material is not None:
+            where.append('material = ?')
+            params.append(material)
+
+        columns = GROUP_COLUMNS[group_by]
+        sql = (f"SELECT start, {', '.join(columns)}, SUM(count) FROM rollups WHERE {' AND '.join(where)} "
+               f"GROUP BY start, {', '.join(columns)} ORDER BY start")
+        return [dict(zip(['start', *columns, 'count'], row)) for row in self._reader().execute(sql, params)]
+
+    def recent(self, limit=100, device=None):
+        """The latest raw sort events, newest first."""
+        sql = 'SELECT ts, device, material, count, item FROM events'
+        params = []
+        if device is not None:
+            sql += ' WHERE device = ?'
+            params.append(device)
+        sql += ' ORDER BY ts DESC LIMIT ?'
+        params.append(limit)
+        keys = ['time', 'device', 'material', 'count', 'item']
+        return [dict(zip(keys, row)) for row in self._reader().execute(sql, params)]
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
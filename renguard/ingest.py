@@ -0,0 +1,345 @@
+# Batched, idempotent count ingestion from many detectors.
+#
+# Detectors post sequence-numbered entries, each either a count delta or a
+# single sort event. stream identifies the detector's outbox file; seqs
+# restart at 1 whenever it changes:
+#
+#   POST /ingest
+#   {"device": "bin-1", "stream": 81723409,
+#    "entries": [{"seq": 41, "counts": {"Plastic": 2}},
+#                {"seq": 42, "material": "Tin", "time": 1730000000.0, "item": 7}]}
+#
+# A retried batch is harmless: entries whose (device, stream, seq) was
+# already applied are skipped. Totals are kept per device and globally.
+
+import gzip
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+from renguard.outbox import Outbox
+
+
+class IngestError(ValueError):
+    """Raised for a malformed ingest payload."""
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_payload(data):
+    """
+    Validates an ingest payload. Returns (device, stream, [(seq, counts,
+    event)]), where event is the sort event dict for single-item entries or
+    None, and stream is None for clients that don't send one.
+    """
+    if not isinstance(data, dict):
+        raise IngestError("Payload must be a JSON object")
+    device = data.get("device")
+    entries = data.get("entries")
+    if not isinstance(device, str) or not device:
+        raise IngestError("Missing device")
+    if not isinstance(entries, list):
+        raise IngestError("Missing entries list")
+    stream = data.get("stream")
+    if stream is not None and not _is_int(stream):
+        raise IngestError("stream must be an integer")
+
+    parsed = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise IngestError("Each entry must be an object")
+        seq = entry.get("seq")
+        if not _is_int(seq) or seq < 1:
+            raise IngestError("Each entry needs a positive integer seq")
+        if "material" in entry:
+            material = entry["material"]
+            if not isinstance(material, str):
+                raise IngestError(f"Entry {seq}: material must be a string")
+            ts, item = entry.get("time"), entry.get("item")
+            if ts is not None and not _is_number(ts):
+                raise IngestError(f"Entry {seq}: time must be a number")
+            if item is not None and not _is_int(item):
+                raise IngestError(f"Entry {seq}: item must be an integer")
+            event = {"material": material, "time": time.time() if ts is None else ts, "item": item}
+            parsed.append((seq, {material: 1}, event))
+        elif isinstance(entry.get("counts"), dict):
+            counts = entry["counts"]
+            if not all(isinstance(k, str) and _is_int(v) and v > 0 for k, v in counts.items()):
+                raise IngestError(f"Entry {seq}: counts must map material names to positive integers")
+            parsed.append((seq, counts, None))
+        else:
+            raise IngestError(f"Entry {seq}: needs either counts or material")
+    return device, stream, parsed
+
+
+def parse_totals(data):
+    """Validates a legacy /post_data body: {material: non-negative integer}."""
+    if not isinstance(data, dict) or not all(isinstance(k, str) and _is_int(v) and v >= 0 for k, v in data.items()):
+        raise IngestError("Totals must map material names to non-negative integers")
+    return data
+
+
+class DeviceState:
+    """Per-device totals and the sequence numbers already applied."""
+
+    def __init__(self):
+        self.counts = Counter()
+        # Outbox the seqs belong to (None until a client sends one)
+        self.stream = None
+        # Every seq <= high has been applied; seen holds applied seqs above it
+        self.high = 0
+        self.seen = set()
+        self.last_seen = None
+        # Running totals from the last legacy /post_data
+        self.reported = Counter()
+
+    def is_duplicate(self, seq):
+        return seq <= self.high or seq in self.seen
+
+    def mark(self, seq):
+        self.seen.add(seq)
+        while self.high + 1 in self.seen:
+            self.high += 1
+            self.seen.discard(self.high)
+
+
+class IngestLedger:
+    """
+    Applies ingest batches to a CounterStore (the global totals) while
+    tracking per-device totals and de-duplicating by (device, stream, seq).
+
+    apply() and set_totals() take an optional persist callback, called with
+    (device, delta, events, last_seq, stream) before anything is marked as
+    applied. If it raises, the ledger is left as it was and the exception
+    propagates, so the client's retry is applied instead of being reported
+    as a duplicate.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.devices = {}
+        self._lock = threading.Lock()
+
+    def apply(self, device, entries, stream=None, persist=None):
+        """
+        Applies parsed entries from one device. Returns (accepted seqs,
+        duplicate seqs, combined delta, sort events applied).
+        """
+        accepted, duplicates, events = [], [], []
+        delta = Counter()
+        with self._lock:
+            state = self.devices.setdefault(device, DeviceState())
+            # Work on a copy of the seq window so nothing is marked until persist succeeds
+            seqs = DeviceState()
+            if stream is None or state.stream is None or stream == state.stream:
+                seqs.high, seqs.seen = state.high, set(state.seen)
+            # else: a new outbox, whose seqs start again at 1
+            for seq, counts, event in entries:
+                if seqs.is_duplicate(seq):
+                    duplicates.append(seq)
+                    continue
+                seqs.mark(seq)
+                accepted.append(seq)
+                delta.update(counts)
+                if event is not None:
+                    events.append(dict(event, device=device))
+            new_stream = state.stream if stream is None else stream
+            if accepted and persist is not None:
+                persist(device, dict(delta), events, seqs.high, new_stream)
+            if accepted:
+                state.stream = new_stream
+                state.high, state.seen = seqs.high, seqs.seen
+            state.counts.update(delta)
+            state.last_seen = time.time()
+            if delta:
+                # One version bump for the whole batch
+                self.store.update(delta)
+        return accepted, duplicates, dict(delta), events
+
+    def set_totals(self, device, totals, persist=None):
+        """
+        Legacy path for detectors that post running totals: applies the
+        difference from what this device reported last time. A total lower
+        than last time means the detector restarted and began a new
+        session, so the new totals are added as they are; counts never go
+        down.
+        """
+        totals = parse_totals(totals)
+        with self._lock:
+            state = self.devices.setdefault(device, DeviceState())
+            previous = state.reported
+            if any(n < previous.get(m, 0) for m, n in totals.items()):
+                delta = {m: n for m, n in totals.items() if n}
+            else:
+                delta = {m: n - previous.get(m, 0) for m, n in totals.items() if n != previous.get(m, 0)}
+            if delta and persist is not None:
+                persist(device, delta, [], None, None)
+            state.reported = Counter(totals)
+            state.counts.update(delta)
+            state.last_seen = time.time()
+            if delta:
+                self.store.update(delta)
+        return delta
+
+    def restore(self, devices):
+        """
+        Reloads per-device totals and last applied seq after a restart, e.g.
+        from HistoryStore.devices(), so retries from before it stay de-duplicated.
+        """
+        with self._lock:
+            for name, saved in devices.items():
+                state = self.devices.setdefault(name, DeviceState())
+                state.counts = Counter(saved.get("counts", {}))
+                # Legacy detectors compare their next running totals with what they reached before
+                state.reported = Counter(state.counts)
+                state.stream = saved.get("stream")
+                state.high = max(state.high, saved.get("last_seq", 0))
+                state.last_seen = saved.get("last_seen")
+
+    def last_seq(self, device):
+        """Highest seq below which every entry from device has been applied."""
+        with self._lock:
+            state = self.devices.get(device)
+            return state.high if state else 0
+
+    def device_summary(self):
+        with self._lock:
+            return {name: {"counts": dict(state.counts), "stream": state.stream, "last_seq": state.high,
+                           "last_seen": state.last_seen}
+                    for name, state in self.devices.items()}
+
+
+def decode_body(body, content_encoding=None):
+    """Parses a JSON request body, gunzipping it first if it was sent compressed."""
+    try:
+        if content_encoding == 'gzip':
+            body = gzip.decompress(body)
+        return json.loads(body)
+    except (OSError, EOFError, ValueError):
+        raise IngestError("Body is not valid JSON")
+
+
+def post_batch(server_url, device, entries, session=None, timeout=(3, 10), compress_over=1024, stream=None):
+    """
+    Posts one batch of entries to /ingest, gzipped when the body is larger
+    than compress_over bytes. Raises requests' RequestException on failure.
+    """
+    import requests
+
+    payload = {"device": device, "entries": entries}
+    if stream is not None:
+        payload["stream"] = stream
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    headers = {"Content-Type": "application/json"}
+    if len(body) > compress_over:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    response = (session or requests).post(server_url, data=body, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+class IngestClient:
+    """
+    Detector side of /ingest. add() and add_counts() only write the entry to
+    a local Outbox, so detection never waits on the network. A background
+    thread drains the outbox in batches over one keep-alive session, backing
+    off exponentially while the server is unreachable. Unsent entries stay
+    on disk and go out on the next run. With metrics, each post is recorded
+    as 'network_post'.
+    """
+
+    def __init__(self, server_url, device, outbox_path='outbox.db', interval=1.0, batch_size=500,
+                 max_backoff=60.0, metrics=None):
+        self.server_url = server_url
+        self.device = device
+        self.outbox = Outbox(outbox_path)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.metrics = metrics
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ingest', daemon=True)
+
+    def add(self, material, item=None):
+        """Queues one sort event."""
+        self.outbox.put({"material": material, "time": time.time(), "item": item})
+
+    def add_counts(self, counts):
+        """Queues a count delta, e.g. {"Plastic": 2}. Zero counts are left out; the server rejects them."""
+        self.outbox.put({"counts": {m: n for m, n in counts.items() if n}})
+
+    def pending(self):
+        """Number of entries not yet accepted by the server."""
+        return len(self.outbox)
+
+    def flush(self, session=None):
+        """
+        Sends queued entries until the outbox is empty. Returns False if a
+        post failed; the entries that were not sent stay queued.
+        """
+        import requests
+
+        while True:
+            batch = self.outbox.peek(self.batch_size)
+            if not batch:
+                return True
+            start = time.perf_counter()
+            try:
+                post_batch(self.server_url, self.device, batch, session, stream=self.outbox.stream)
+            except requests.exceptions.RequestException as e:
+                if getattr(e.response, 'status_code', None) == 400:
+                    # The server will never accept this batch; retrying would block everything behind it
+                    print(f"Server rejected {len(batch)} entries, dropping them: {e.response.text}")
+                    self.outbox.ack(batch[-1]["seq"])
+                    continue
+                print(f"Failed to send {len(batch)} entries to the server, will retry: {e}")
+                return False
+            if self.metrics is not None:
+                self.metrics.add('network_post', time.perf_counter() - start)
+            self.outbox.ack(batch[-1]["seq"])
+
+    def _run(self):
+        import requests
+
+        delay = self.interval
+        with requests.Session() as session:
+            # One pooled keep-alive connection to the server
+            session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            while not self._stop.wait(delay):
+                if self.flush(session):
+                    delay = self.interval
+                else:
+                    # Exponential backoff with jitter so many detectors don't retry in lockstep
+                    delay = min(self.max_backoff, delay * 2) * random.uniform(0.75, 1.0)
+            self.flush(session)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        """
+        Stops the sender after one last attempt to drain the outbox, waiting
+        at most timeout seconds. Returns the number of entries left queued.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        left = self.pending()
+        if not self._thread.is_alive():
+            self.outbox.close()
+        return left
+
+    def close(self):
+        """Closes the outbox when the client was only used through flush()."""
+        self.outbox.close()
@@ -0,0 +1,168 @@
+# Rolling latency/FPS statistics for every stage of the sorting pipeline.
+#
+# Each stage keeps its last N samples in a fixed-size ring buffer. Adding a
+# sample and reading the rolling mean are O(1); percentiles are computed on
+# demand when a report is made, never on the per-frame path.
+
+import csv
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+# Stage names used across the scripts
+STAGES = ('capture', 'gate', 'preprocess', 'inference', 'postprocess', 'decision', 'actuation', 'network_post')
+
+
+def percentiles(values, *qs):
+    """Percentiles (0-100) of values, linearly interpolated."""
+    ordered = sorted(values)
+    if not ordered:
+        return [0.0 for _ in qs]
+    last = len(ordered) - 1
+    result = []
+    for q in qs:
+        pos = last * q / 100.0
+        lo = int(pos)
+        hi = min(lo + 1, last)
+        result.append(ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo))
+    return result
+
+
+class RingBuffer:
+    """Fixed-size array-backed buffer of float samples with a running sum."""
+
+    def __init__(self, size=200):
+        self.size = size
+        self.data = array('d', bytes(8 * size))
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def append(self, value):
+        if self.count == self.size:
+            self.total -= self.data[self.index]
+        else:
+            self.count += 1
+        self.data[self.index] = value
+        self.total += value
+        self.index = (self.index + 1) % self.size
+
+    def __len__(self):
+        return self.count
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def values(self):
+        """Samples currently held, oldest first."""
+        if self.count < self.size:
+            return self.data[:self.count].tolist()
+        return (self.data[self.index:] + self.data[:self.index]).tolist()
+
+    def percentiles(self, *qs):
+        """Percentiles (0-100) of the held samples."""
+        return percentiles(self.values(), *qs)
+
+
+class Metrics:
+    """
+    Per-stage timers backed by ring buffers. Safe to update from several
+    threads (e.g. the detection loop and the sorter worker).
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.stages = {}
+        self.totals = {}
+        self.t_start = time.perf_counter()
+        self._last_export = self.t_start
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            buf = self.stages.get(stage)
+            if buf is None:
+                buf = self.stages[stage] = RingBuffer(self.size)
+                self.totals[stage] = 0
+            buf.append(seconds)
+            self.totals[stage] += 1
+
+    @contextmanager
+    def time(self, stage):
+        """Times the enclosed block: with metrics.time('inference'): ..."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def mean(self, stage):
+        with self._lock:
+            buf = self.stages.get(stage)
+            return buf.mean() if buf else 0.0
+
+    def summary(self):
+        """Dict of stage -> count, rate and latency percentiles in milliseconds."""
+        with self._lock:
+            snapshot = {name: (buf.mean(), buf.values(), self.totals[name])
+                        for name, buf in self.stages.items()}
+            elapsed = time.perf_counter() - self.t_start
+
+        result = {}
+        for name, (mean, values, total) in snapshot.items():
+            p50, p95, p99 = percentiles(values, 50, 95, 99)
+            result[name] = {
+                "count": total,
+                "rate": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+                "mean_ms": round(1000 * mean, 2),
+                "p50_ms": round(1000 * p50, 2),
+                "p95_ms": round(1000 * p95, 2),
+                "p99_ms": round(1000 * p99, 2),
+                "max_ms": round(1000 * max(values), 2) if values else 0.0,
+            }
+        return result
+
+    def report(self):
+        """Prints the summary as a table."""
+        print('Stage latency (rolling window):')
+        for name, s in self.summary().items():
+            print(f"  {name:<13} n={s['count']:<7} {s['rate']:>7.2f}/s  mean {s['mean_ms']:>8.2f} ms  "
+                  f"p50 {s['p50_ms']:>8.2f}  p95 {s['p95_ms']:>8.2f}  p99 {s['p99_ms']:>8.2f}  max {s['max_ms']:>8.2f}")
+
+    def write_csv(self, path):
+        """Appends one row per stage to a CSV file, writing a header for new files."""
+        summary = self.summary()
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(['timestamp', 'stage', 'count', 'rate', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+            now = time.strftime('%Y-%m-%dT%H:%M:%S')
+            for name, s in summary.items():
+                writer.writerow([now, name, s['count'], s['rate'], s['mean_ms'],
+                                 s['p50_ms'], s['p95_ms'], s['p99_ms'], s['max_ms']])
+
+    def periodic(self, interval, csv_path=None, console=True):
+        """
+        Call from the main loop: every interval seconds prints the summary
+        and/or appends it to csv_path. Returns True when it exported.
+        """
+        now = time.perf_counter()
+        if now - self._last_export < interval:
+            return False
+        self._last_export = now
+        if console:
+            self.report()
+        if csv_path:
+            self.write_csv(csv_path)
+        return True
+
+
+def add_metrics_args(parser):
+    """Adds the shared --metrics/--metrics-interval options to a parser."""
+    parser.add_argument('--metrics', help='CSV file to append per-stage latency stats to (example: "metrics.csv")',
+                        default=None)
+    parser.add_argument('--metrics-interval', help='Seconds between stage latency reports', type=float, default=30)
+    return parser
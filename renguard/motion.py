@@ -0,0 +1,115 @@
+# Cheap motion/occupancy gate in front of the model.
+#
+# Most frames show an empty chute, and each one would otherwise pay a full
+# YOLO forward pass. The gate crops the region over the bin opening, shrinks
+# it to a small grayscale image and compares it with a slowly updated
+# background. The model only runs while enough of the region differs from
+# the background, and keeps running for a cooldown after it settles, so an
+# item is followed until it has gone down the chute.
+
+import argparse
+import time
+
+from renguard.roi import crop, parse_roi
+
+
+class MotionGate:
+    """
+    Decides per frame whether the model needs to run.
+
+    Hysteresis: the gate opens when more than start_fraction of the ROI
+    pixels differ from the background by threshold grey levels, and closes
+    only once fewer than stop_fraction differ for cooldown seconds. The
+    background only learns while the gate is closed, so an item that stops
+    in the chute keeps the gate open. If the gate stays open for longer than
+    max_active seconds the scene is assumed to have changed for good (e.g.
+    lighting) and the background is reset.
+    """
+
+    def __init__(self, roi=None, width=160, threshold=25, start_fraction=0.02, stop_fraction=0.005,
+                 cooldown=1.0, alpha=0.05, max_active=30.0):
+        self.roi = roi
+        self.width = width
+        self.threshold = threshold
+        self.start_fraction = start_fraction
+        self.stop_fraction = stop_fraction
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.max_active = max_active
+        self.active = False
+        self.background = None
+        self.opened_at = 0.0
+        self.last_motion = 0.0
+        self.checked = 0
+        self.passed = 0
+
+    def _small_gray(self, frame):
+        import cv2
+        import numpy as np
+
+        region, _ = crop(frame, self.roi)
+        if region.ndim == 3:
+            region = cv2.cvtColor(region, cv2.COLOR_BGRA2GRAY if region.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+        h, w = region.shape[:2]
+        size = (self.width, max(1, round(h * self.width / w)))
+        small = cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+        # Blur away sensor noise so it doesn't count as motion
+        return cv2.GaussianBlur(small, (5, 5), 0).astype(np.float32)
+
+    def check(self, frame, now=None):
+        """Returns True if the model should run on this frame."""
+        import cv2
+        import numpy as np
+
+        now = time.monotonic() if now is None else now
+        gray = self._small_gray(frame)
+        self.checked += 1
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray
+            return False
+
+        changed = np.count_nonzero(cv2.absdiff(gray, self.background) > self.threshold) / gray.size
+        if not self.active:
+            if changed >= self.start_fraction:
+                self.active = True
+                self.opened_at = self.last_motion = now
+        elif changed >= self.stop_fraction:
+            self.last_motion = now
+            if now - self.opened_at > self.max_active:
+                # No item takes this long to pass; take the new scene as the background
+                self.background = gray
+                self.active = False
+        elif now - self.last_motion >= self.cooldown:
+            self.active = False
+
+        if not self.active:
+            cv2.accumulateWeighted(gray, self.background, self.alpha)
+        else:
+            self.passed += 1
+        return self.active
+
+    def stats(self):
+        """Frames checked and the share that went to the model."""
+        return {"checked": self.checked, "inferred": self.passed,
+                "skipped_pct": round(100.0 * (1 - self.passed / self.checked), 1) if self.checked else 0.0}
+
+
+def add_motion_args(parser, default=True):
+    """Adds the shared --gate/--roi/--motion-threshold/--cooldown options to a parser."""
+    parser.add_argument('--gate', help='Only run the model when something moves in the ROI',
+                        action=argparse.BooleanOptionalAction, default=default)
+    parser.add_argument('--roi', help='Only look at this region over the bin opening, as fractions x1,y1,x2,y2 (example: "0.25,0.2,0.75,0.9")',
+                        default='')
+    parser.add_argument('--motion-threshold', help='Fraction of ROI pixels that must change to start inference',
+                        type=float, default=0.02)
+    parser.add_argument('--cooldown', help='Seconds to keep running the model after motion stops',
+                        type=float, default=1.0)
+    return parser
+
+
+def gate_from_args(args):
+    """Builds the MotionGate configured on the command line, or None with --no-gate."""
+    if not args.gate:
+        return None
+    return MotionGate(roi=parse_roi(args.roi), start_fraction=args.motion_threshold,
+                      stop_fraction=args.motion_threshold / 4, cooldown=args.cooldown)
@@ -0,0 +1,296 @@
+# Several chutes from one process: N cameras and N servo pairs, one model.
+#
+# Each camera is read on its own thread, keeping only its newest frame.
+# The main loop takes whatever frames are ready, runs the motion gate of
+# each bin, and sends the ROI crops that passed to the model in a single
+# call, so two chutes cost one model in memory and one forward pass per
+# round instead of two. Results are handed back to their bin, which has
+# its own tracker, decision engine, servo planner, sorter queue and log
+# (renguard.sortbin.Bin, the same one the single-camera scripts use), so
+# nothing one chute does can leak into another's decisions.
+#
+# Bins are described in a JSON file. The options in BIN_OPTIONS can be
+# overridden per bin with their argparse names; model and process options
+# (imgsz, backend, conf, evidence, metrics, batch, ...) are shared by every
+# bin and only set on the command line:
+#   {
+#     "bins": [
+#       {"name": "left", "source": 0, "roi": "0.25,0.2,0.75,0.9", "base_pin": 17, "drop_pin": 18},
+#       {"name": "right", "source": 1, "base_pin": 22, "drop_pin": 23, "vote_share": 0.8}
+#     ]
+#   }
+#
+# Example:
+#   sudo python -m renguard.multibin --config bins.json --backend ncnn --precision fp16
+
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+
+from renguard.core import ClassTable, Frame, add_model_args, build_frame, check_model_args, load_model
+from renguard.decision import add_decision_args
+from renguard.eventlog import DetectionLog
+from renguard.evidence import add_evidence_args, archive_from_args
+from renguard.metrics import Metrics, add_metrics_args
+from renguard.motion import add_motion_args
+from renguard.roi import crop, parse_roi
+from renguard.servos import BASE_PIN, DROP_PIN, add_servo_args
+from renguard.sortbin import open_bin
+
+# Keys a bin may set besides overrides of the shared options
+BIN_KEYS = ('name', 'source', 'base_pin', 'drop_pin', 'log')
+# Shared options a bin may override; everything else belongs to the model or the process
+BIN_OPTIONS = ('roi', 'gate', 'motion_threshold', 'cooldown', 'vote_window', 'vote_share', 'decision_deadline',
+               'servo_driver', 'servo_speed', 'drop_hold')
+
+
+class CameraFeed:
+    """
+    Reads one source (camera index, video file or image folder) on its own
+    thread and keeps only the newest frame, like Pipeline(latest=True).
+    Sets the shared ready event whenever a frame arrives.
+    """
+
+    def __init__(self, source, ready):
+        self.source = source
+        self.ready = ready
+        self.index = 0
+        self.dropped = 0
+        self.finished = False
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'camera-{source}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        from renguard.core import read_frames
+
+        frames = read_frames(self.source)
+        try:
+            for image in frames:
+                if self._stop.is_set():
+                    break
+                with self._lock:
+                    if self._latest is not None:
+                        self.dropped += 1
+                    self.index += 1
+                    self._latest = (self.index, image)
+                self.ready.set()
+        except Exception as e:
+            print(f"Camera {self.source} failed: {e}")
+        finally:
+            frames.close()
+            self.finished = True
+            self.ready.set()
+
+    def take(self):
+        """The newest (index, image) not taken yet, or None."""
+        with self._lock:
+            latest, self._latest = self._latest, None
+        return latest
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+class MultiBinRuntime:
+    """
+    Shares one model between bins. With batch=True the crops of every bin
+    with a fresh, ungated frame go to the model in one call; exported
+    models with a fixed batch size of 1 need batch=False (one call per crop,
+    still one model in memory).
+    """
+
+    def __init__(self, model, table, bins, ready, imgsz, batch=True, min_conf=0.0, metrics=None):
+        from renguard.postprocess import material_lookup
+
+        self.model = model
+        self.table = table
+        self.lookup = material_lookup(table)
+        self.bins = bins
+        self.ready = ready
+        self.imgsz = imgsz
+        self.batch = batch
+        self.min_conf = min_conf
+        self.metrics = metrics or Metrics()
+        self.rounds = 0
+        self.inferred = 0
+
+    def _infer(self, regions):
+        if self.batch:
+            return self.model(regions, imgsz=self.imgsz, verbose=False)
+        return [self.model(region, imgsz=self.imgsz, verbose=False)[0] for region in regions]
+
+    def step(self, timeout=0.1):
+        """
+        Runs one round over every bin. Returns the number of frames handled,
+        or None once every camera has finished.
+        """
+        # Cleared before polling, so a frame that arrives meanwhile wakes the next wait
+        self.ready.clear()
+        pending = []
+        handled = 0
+        for b in self.bins:
+            got = b.camera.take()
+            if got is None:
+                continue
+            index, image = got
+            if b.gate is not None:
+                with self.metrics.time('gate'):
+                    run = b.gate.check(image)
+                if not run:
+                    # Empty frame so the bin's tracker and votes still see time pass
+                    b.handle(Frame(index, None, [], [], image))
+                    handled += 1
+                    continue
+            region, offset = crop(image, b.roi)
+            pending.append((b, index, image, region, offset))
+
+        if pending:
+            with self.metrics.time('inference'):
+                results = self._infer([p[3] for p in pending])
+            self.rounds += 1
+            self.inferred += len(pending)
+            for (b, index, image, _, offset), result in zip(pending, results):
+                t0 = time.perf_counter()
+                frame = build_frame(index, result, image, self.table, self.lookup, self.min_conf, offset)
+                self.metrics.add('postprocess', time.perf_counter() - t0)
+                b.handle(frame)
+                handled += 1
+
+        if not handled:
+            if all(b.camera.finished for b in self.bins):
+                return None
+            self.ready.wait(timeout)
+        return handled
+
+    def stats(self):
+        return {"inference_calls": self.rounds, "frames_inferred": self.inferred,
+                "frames_per_call": round(self.inferred / self.rounds, 2) if self.rounds else 0.0}
+
+
+def load_config(path):
+    """Reads and checks the bins config. Raises ValueError for a bad file."""
+    with open(path) as f:
+        config = json.load(f)
+    bins = config.get('bins') if isinstance(config, dict) else None
+    if not bins or not isinstance(bins, list):
+        raise ValueError(f"{path} needs a non-empty \"bins\" list")
+    names = set()
+    for i, spec in enumerate(bins):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Bin {i} in {path} must be an object")
+        name = spec.setdefault('name', f'bin{i}')
+        if name in names:
+            raise ValueError(f"Bin name '{name}' is used twice")
+        names.add(name)
+        spec.setdefault('source', i)
+    return bins
+
+
+def bin_args(args, spec):
+    """The shared options with this bin's overrides applied. Raises ValueError for keys a bin can't set."""
+    shared = [key for key in spec if key not in BIN_KEYS and key not in BIN_OPTIONS and hasattr(args, key)]
+    if shared:
+        raise ValueError(f"Option(s) {', '.join(shared)} in bin '{spec['name']}' apply to the whole process; "
+                         f"set them on the command line")
+    unknown = [key for key in spec if key not in BIN_KEYS and key not in BIN_OPTIONS]
+    if unknown:
+        raise ValueError(f"Unknown option(s) for bin '{spec['name']}': {', '.join(unknown)}")
+    return argparse.Namespace(**{**vars(args), **{k: v for k, v in spec.items() if k in BIN_OPTIONS}})
+
+
+def check_bins(specs, args):
+    """Checks every bin's options and that no two servo pairs share a GPIO pin. Raises ValueError."""
+    pins = {}
+    for spec in specs:
+        opts = bin_args(args, spec)
+        parse_roi(opts.roi)
+        if opts.servo_driver == 'sim':
+            continue
+        for pin in (spec.get('base_pin', BASE_PIN), spec.get('drop_pin', DROP_PIN)):
+            if pin in pins:
+                raise ValueError(f"GPIO {pin} is used by bins '{pins[pin]}' and '{spec['name']}'")
+            pins[pin] = spec['name']
+
+
+def open_bins(specs, args, ready, metrics, evidence=None):
+    """Builds a Bin (not yet started) for each config entry."""
+    host = socket.gethostname()
+    bins = []
+    try:
+        for spec in specs:
+            log = DetectionLog(spec.get('log', f"detected-{spec['name']}.txt"))
+            try:
+                bins.append(open_bin(bin_args(args, spec), metrics, spec['name'], spec.get('base_pin', BASE_PIN),
+                                     spec.get('drop_pin', DROP_PIN), log=log, evidence=evidence,
+                                     device=f"{host}-{spec['name']}", camera=CameraFeed(spec['source'], ready)))
+            except Exception:
+                log.close()
+                raise
+    except Exception:
+        for b in bins:
+            b.servos.close()
+            b.log.close()
+        raise
+    return bins
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run several cameras and servo pairs from one process with one shared model.')
+    parser.add_argument('--config', help='JSON file describing the bins', required=True)
+    parser.add_argument('--batch', help='Send every camera\'s crop to the model in one call (default: only for --backend pt)',
+                        action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument('--conf', help='Minimum detection confidence', type=float, default=0.0)
+    for add_args in (add_model_args, add_metrics_args, add_motion_args, add_decision_args, add_servo_args,
+                     add_evidence_args):
+        add_args(parser)
+    args = check_model_args(parser, parser.parse_args(argv))
+
+    try:
+        specs = load_config(args.config)
+        check_bins(specs, args)
+    except (OSError, ValueError) as e:
+        print(f'ERROR: {e}')
+        return 1
+
+    metrics = Metrics()
+    ready = threading.Event()
+    model = load_model(args.model, args.backend, args.precision)
+    evidence = archive_from_args(args)
+    bins = open_bins(specs, args, ready, metrics, evidence)
+    batch = args.batch if args.batch is not None else args.backend == 'pt'
+    runtime = MultiBinRuntime(model, ClassTable(model.names), bins, ready, args.imgsz, batch=batch,
+                              min_conf=args.conf, metrics=metrics)
+    for b in bins:
+        b.start()
+    print(f"Running {len(bins)} bins ({', '.join(b.name for b in bins)}) on one model... Press Ctrl+C to stop.\n")
+
+    try:
+        while runtime.step() is not None:
+            metrics.periodic(args.metrics_interval, csv_path=args.metrics)
+    except KeyboardInterrupt:
+        print("\nDetection stopped by user.")
+    finally:
+        for b in bins:
+            b.close()
+            print(f"[{b.name}]", b.stats())
+        print("Model:", runtime.stats())
+        if evidence:
+            evidence.close()
+        metrics.report()
+        if args.metrics:
+            metrics.write_csv(args.metrics)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# Durable store-and-forward queue for uploads from a detector.
+#
+# Entries are written to a small SQLite file before anything is sent, so a
+# network outage, a slow server or a restart never loses counts. Each entry
+# gets the next sequence number when it is queued; the server de-duplicates
+# on (device, stream, seq), so an entry that is sent twice is only counted
+# once. The stream is a random id picked when the outbox file is created:
+# if the file is deleted or the unit is reflashed, seqs restart at 1 under a
+# new stream and the server starts counting them afresh instead of taking
+# them for duplicates.
+# Only one batch is ever held in memory, however long the backlog gets.
+
+import json
+import random
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class Outbox:
+    """On-disk FIFO of JSON entries, each stamped with an increasing seq."""
+
+    def __init__(self, path='outbox.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        row = self._conn.execute("SELECT value FROM state WHERE key = 'seq'").fetchone()
+        # Seqs are never reused, even after the queue has been emptied
+        self._seq = row[0] if row else 0
+        row = self._conn.execute("SELECT value FROM state WHERE key = 'stream'").fetchone()
+        if row is None:
+            with self._conn as conn:
+                conn.execute("INSERT INTO state (key, value) VALUES ('stream', ?)", (random.getrandbits(62) + 1,))
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'stream'").fetchone()
+        self.stream = row[0]
+
+    def put(self, entry):
+        """Queues a copy of entry with the next seq. Returns the seq."""
+        with self._lock, self._conn as conn:
+            self._seq += 1
+            conn.execute('INSERT INTO entries (seq, body) VALUES (?, ?)',
+                         (self._seq, json.dumps(dict(entry, seq=self._seq))))
+            conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('seq', ?)", (self._seq,))
+            return self._seq
+
+    def peek(self, limit=500):
+        """The oldest entries still queued, up to limit."""
+        with self._lock:
+            rows = self._conn.execute('SELECT body FROM entries ORDER BY seq LIMIT ?', (limit,)).fetchall()
+        return [json.loads(body) for body, in rows]
+
+    def ack(self, last_seq):
+        """Removes every entry up to and including last_seq."""
+        with self._lock, self._conn as conn:
+            conn.execute('DELETE FROM entries WHERE seq <= ?', (last_seq,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,186 @@
+# Threaded capture -> preprocess -> infer pipeline with bounded queues.
+#
+# Each stage runs on its own thread so camera I/O, inference and the
+# caller's render/record loop overlap across the Pi's cores. The caller
+# iterates the pipeline on the main thread (OpenCV windows must live there)
+# and reports its own render time with pipeline.record('render', seconds).
+
+import queue
+import threading
+import time
+
+from renguard.metrics import Metrics
+
+# End-of-stream marker passed down the queues
+_END = object()
+
+
+class Packet:
+    """One frame moving through the pipeline."""
+
+    __slots__ = ('index', 't_capture', 'captured', 'frame', 'result')
+
+    def __init__(self, index, frame):
+        self.index = index
+        self.t_capture = time.perf_counter()
+        # The frame read_fn returned, kept for release_fn after preprocess replaces frame
+        self.captured = frame
+        self.frame = frame
+        self.result = None
+
+
+class Pipeline:
+    """
+    read_fn() returns the next frame or None at end of source.
+    preprocess_fn(frame) returns the frame to infer on.
+    infer_fn(frame) returns the inference result for that frame.
+    postprocess_fn(result), if given, runs on the inference thread and is
+    timed separately.
+    release_fn(frame), if given, gets back each frame read_fn returned once
+    the pipeline is done with it: when it is dropped as stale, or when the
+    caller's loop moves past its packet. Capture sources that reuse buffers
+    (PicameraSource) use it to know which ones are free.
+
+    With latest=True (live cameras) the capture thread keeps only the newest
+    frame, so inference always works on fresh data and stale frames are
+    dropped instead of piling up. With latest=False (files, folders) every
+    frame is processed in order.
+
+    Stage timings go to metrics (a renguard.metrics.Metrics) under
+    capture, preprocess, inference, postprocess, render and end_to_end.
+    """
+
+    def __init__(self, read_fn, preprocess_fn, infer_fn, postprocess_fn=None, latest=True, depth=2, metrics=None,
+                 release_fn=None):
+        self.latest = latest
+        self.postprocess_fn = postprocess_fn
+        self.release_fn = release_fn
+        self.stop_event = threading.Event()
+        self.metrics = metrics or Metrics()
+        self.dropped = 0
+
+        self._captured = queue.Queue(maxsize=1 if latest else depth)
+        self._prepared = queue.Queue(maxsize=depth)
+        self._inferred = queue.Queue(maxsize=depth)
+        self._threads = [
+            threading.Thread(target=self._capture, args=(read_fn,), name='capture', daemon=True),
+            threading.Thread(target=self._stage, args=('preprocess', preprocess_fn, self._captured, self._prepared),
+                             name='preprocess', daemon=True),
+            threading.Thread(target=self._stage, args=('inference', infer_fn, self._prepared, self._inferred),
+                             name='inference', daemon=True),
+        ]
+
+    @staticmethod
+    def frames_in_flight(latest=True, depth=2):
+        """
+        Most frames a pipeline holds at once: one per stage thread, the
+        caller's, and a full queue between each pair of stages. A capture
+        source with this many buffers, handed back through release_fn,
+        only has to drop a capture when the pipeline is completely full.
+        """
+        return 4 + (1 if latest else depth) + 2 * depth
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    def _put(self, q, item):
+        # Blocking put that still notices a stop request
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _put_latest(self, q, item):
+        # Latest-frame-wins: replace whatever the next stage has not picked up yet
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._release(q.get_nowait())
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _release(self, packet):
+        if self.release_fn is not None and packet is not _END:
+            self.release_fn(packet.captured)
+
+    def _capture(self, read_fn):
+        index = 0
+        while not self.stop_event.is_set():
+            t0 = time.perf_counter()
+            frame = read_fn()
+            if frame is None:
+                self._put(self._captured, _END)
+                return
+            index += 1
+            self.metrics.add('capture', time.perf_counter() - t0)
+            packet = Packet(index, frame)
+            if self.latest:
+                self._put_latest(self._captured, packet)
+            elif not self._put(self._captured, packet):
+                return
+
+    def _stage(self, name, fn, inbox, outbox):
+        while not self.stop_event.is_set():
+            try:
+                packet = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if packet is _END:
+                self._put(outbox, _END)
+                return
+            t0 = time.perf_counter()
+            try:
+                if name == 'inference':
+                    packet.result = fn(packet.frame)
+                    t1 = time.perf_counter()
+                    self.metrics.add(name, t1 - t0)
+                    if self.postprocess_fn is not None:
+                        packet.result = self.postprocess_fn(packet.result)
+                        self.metrics.add('postprocess', time.perf_counter() - t1)
+                else:
+                    packet.frame = fn(packet.frame)
+                    self.metrics.add(name, time.perf_counter() - t0)
+            except Exception as e:
+                print(f"Pipeline stage '{name}' failed on frame {packet.index}: {e}")
+                self.stop_event.set()
+                self._put_latest(outbox, _END)
+                return
+            if not self._put(outbox, packet):
+                return
+
+    def __iter__(self):
+        while not self.stop_event.is_set():
+            try:
+                packet = self._inferred.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if packet is _END:
+                return
+            try:
+                yield packet
+            finally:
+                # Also runs when the caller breaks out of the loop
+                self._release(packet)
+            self.metrics.add('end_to_end', time.perf_counter() - packet.t_capture)
+
+    def record(self, name, seconds):
+        """Records time spent in a stage that runs on the caller's thread (e.g. render)."""
+        self.metrics.add(name, seconds)
+
+    def stop(self):
+        self.stop_event.set()
+        for t in self._threads:
+            t.join(timeout=1.0)
+
+    def report(self):
+        self.metrics.report()
+        print(f'  Stale frames dropped by capture: {self.dropped}')
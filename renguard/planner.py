@@ -0,0 +1,92 @@
+# Servo motion planning for the sort cycle.
+#
+# The fixed cycle (move, sleep 1 s, drop, sleep 1 s, reset, sleep 0.5 s)
+# waits the same time for every move, including moves to where a servo
+# already is. The planner remembers where each servo is, skips no-op moves,
+# waits only as long as the angular distance needs at the calibrated speed,
+# and leaves the drop reset running while the base turns for the next item.
+
+import time
+
+from renguard.servos import NEUTRAL_DROP
+
+JOINTS = ('base', 'drop')
+
+
+class ServoPlanner:
+    """
+    Runs sort cycles on any servos.ServoDriver (pigpio, RPi.GPIO or the
+    simulator).
+
+    speed is the calibrated servo speed under load in degrees per second,
+    settle the extra time a servo needs to stop at its target, and
+    drop_hold how long the drop stays open for the item to fall. clock and
+    sleep can be replaced by a servos.SimClock to run cycles in simulated time.
+    """
+
+    def __init__(self, servos, speed=250.0, settle=0.15, drop_hold=0.5, clock=time.perf_counter, sleep=time.sleep):
+        self.servos = servos
+        self.clock = clock
+        self.sleep = sleep
+        self.speed = speed
+        self.settle = settle
+        self.drop_hold = drop_hold
+        # Unknown until first commanded, so the first move waits for a full sweep
+        self.position = dict.fromkeys(JOINTS)
+        # When the move in progress on each joint will be finished
+        self.busy_until = dict.fromkeys(JOINTS, 0.0)
+        self.moving = set()
+        self.moves = 0
+        self.skipped = 0
+
+    def dwell(self, joint, angle):
+        """Seconds a move of joint to angle takes."""
+        current = self.position[joint]
+        distance = 180 if current is None else abs(angle - current)
+        return distance / self.speed + self.settle
+
+    def move(self, joint, angle):
+        """Starts a move without waiting for it. Returns False if the servo was already there."""
+        if self.position[joint] == angle:
+            self.skipped += 1
+            return False
+        self.wait(joint)
+        self.busy_until[joint] = self.clock() + self.dwell(joint, angle)
+        self.servos.write(joint, angle)
+        self.position[joint] = angle
+        self.moving.add(joint)
+        self.moves += 1
+        return True
+
+    def wait(self, joint):
+        """Blocks until the move in progress on joint is done, then releases it."""
+        if joint not in self.moving:
+            return
+        remaining = self.busy_until[joint] - self.clock()
+        if remaining > 0:
+            self.sleep(remaining)
+        self.servos.release(joint)
+        self.moving.discard(joint)
+
+    def sort(self, base_angle, drop_angle):
+        """
+        One sort cycle. Returns as soon as the drop has started closing; the
+        reset finishes while the next item's base rotation runs.
+        """
+        # The base may turn while the previous item's drop is still closing
+        self.move('base', base_angle)
+        self.wait('drop')
+        self.wait('base')
+
+        if self.move('drop', drop_angle):
+            self.wait('drop')
+        self.sleep(self.drop_hold)
+        self.move('drop', NEUTRAL_DROP)
+
+    def idle(self):
+        """Finishes any move in progress, e.g. when no item is waiting."""
+        for joint in JOINTS:
+            self.wait(joint)
+
+    def stats(self):
+        return {"moves": self.moves, "skipped": self.skipped, "position": dict(self.position)}
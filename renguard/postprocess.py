@@ -0,0 +1,73 @@
+# Vectorized post-processing of YOLO results.
+#
+# Results are converted once per frame into contiguous NumPy arrays, and
+# thresholding, class -> material mapping and counting are array operations
+# instead of per-box tensor indexing and .item() calls.
+
+from collections import namedtuple
+
+import numpy as np
+
+from renguard.core import MATERIALS
+
+# xyxy: (N, 4) float32, conf: (N,) float32, cls: (N,) intp
+Detections = namedtuple('Detections', ['xyxy', 'conf', 'cls'])
+
+EMPTY = Detections(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.intp))
+
+
+def to_arrays(boxes):
+    """
+    Converts an Ultralytics Boxes object into Detections with a single
+    device -> host copy. boxes.data rows are x1, y1, x2, y2, [track id,] conf, cls.
+    """
+    data = boxes.data
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    if len(data) == 0:
+        return EMPTY
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    return Detections(np.ascontiguousarray(data[:, :4]),
+                      np.ascontiguousarray(data[:, -2]),
+                      data[:, -1].astype(np.intp))
+
+
+def shift_boxes(dets, dx, dy):
+    """Moves boxes by (dx, dy), e.g. from ROI crop coordinates to the full frame."""
+    if not (dx or dy) or len(dets.cls) == 0:
+        return dets
+    return dets._replace(xyxy=dets.xyxy + np.array([dx, dy, dx, dy], np.float32))
+
+
+def scale_boxes(dets, sx, sy):
+    """Scales boxes by (sx, sy), e.g. from the full frame to a smaller display copy."""
+    if (sx, sy) == (1, 1) or len(dets.cls) == 0:
+        return dets
+    return dets._replace(xyxy=dets.xyxy * np.array([sx, sy, sx, sy], np.float32))
+
+
+def filter_conf(dets, thresh):
+    """Keeps only detections with confidence above thresh."""
+    keep = dets.conf > thresh
+    if keep.all():
+        return dets
+    return Detections(dets.xyxy[keep], dets.conf[keep], dets.cls[keep])
+
+
+def material_lookup(table):
+    """
+    Class id -> index into MATERIALS as an array, -1 for classes that do
+    not map to a sortable material. Build once per model.
+    """
+    return np.array([MATERIALS.index(m) if m in MATERIALS else -1 for m in table.materials],
+                    dtype=np.intp)
+
+
+def material_ids(dets, lookup):
+    """Material index of every detection (-1 for Unknown)."""
+    return lookup[dets.cls]
+
+
+def count_materials(ids):
+    """Counts of each material in MATERIALS order from material_ids()."""
+    return np.bincount(ids[ids >= 0], minlength=len(MATERIALS))
@@ -0,0 +1,197 @@
+# Background video recording and snapshots.
+#
+# Encoding and disk writes happen on a writer thread, so the detection or
+# display loop only pays for putting a frame reference in a queue. The
+# queue is bounded; when the writer falls behind, the oldest frames are
+# dropped (events and snapshots never are), so inference FPS stays steady.
+#
+# In event mode only the seconds around each event are saved: the writer
+# keeps the last `pre` seconds of frames in memory (JPEG-compressed, trimmed
+# by their timestamps), and on trigger() it starts a clip with them and
+# keeps recording until `post` seconds after the last event. Clips are
+# written at the frame rate measured over that buffer, so a detector running
+# slower than --record-fps still plays back at real speed.
+
+import os
+import threading
+import time
+from collections import deque
+
+
+class AsyncRecorder:
+    """
+    write(frame) queues a frame for the video, trigger(label) marks an
+    event, snapshot(frame, path) saves one image. All three return
+    immediately.
+
+    With pre=None every frame goes to path. With pre set, each event gets
+    its own clip in clip_dir named <date>_<time>_<ms>_<label><ext of path>. With
+    path=None nothing is recorded and only snapshots are written.
+    """
+
+    def __init__(self, path='demo1.avi', fps=30, codec='MJPG', queue_size=64, pre=None, post=2.0,
+                 clip_dir='clips', copy=True):
+        self.path = path
+        self.fps = fps
+        self.codec = codec
+        self.pre = pre
+        self.post = post
+        self.clip_dir = clip_dir
+        # Callers that reuse frame buffers (PicameraSource) need the frame copied before it is queued
+        self.copy = copy
+        self.queue_size = queue_size
+        self.written = 0
+        self.dropped = 0
+        self.clips = []
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._writer = None
+        self._clip_until = None
+        self._pending_clip = None
+        # (t, jpeg bytes) of the last pre seconds, oldest first
+        self._recent = deque() if pre else None
+        self._thread = threading.Thread(target=self._run, name='recorder', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _put(self, item):
+        with self._cond:
+            if item[0] == 'frame':
+                frames = sum(1 for i in self._items if i[0] == 'frame')
+                if frames >= self.queue_size:
+                    # Drop the oldest queued frame, keeping events and snapshots in order
+                    for i, queued in enumerate(self._items):
+                        if queued[0] == 'frame':
+                            del self._items[i]
+                            break
+                    self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def write(self, frame, t=None):
+        """Queues a frame for recording (t defaults to now)."""
+        if self.path is None:
+            return
+        self._put(('frame', time.perf_counter() if t is None else t, frame.copy() if self.copy else frame))
+
+    def trigger(self, label='event', t=None):
+        """Marks an event: in event mode, saves the frames from pre seconds before to post seconds after."""
+        self._put(('event', time.perf_counter() if t is None else t, label))
+
+    def snapshot(self, frame, path):
+        """Saves one frame as an image file in the background."""
+        self._put(('snapshot', path, frame.copy() if self.copy else frame))
+
+    def _open(self, path, frame, fps=None):
+        import cv2
+
+        h, w = frame.shape[:2]
+        return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.codec), fps or self.fps, (w, h))
+
+    def _buffer(self, t, frame):
+        import cv2
+
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if ok:
+            self._recent.append((t, jpeg))
+        while self._recent and self._recent[0][0] < t - self.pre:
+            self._recent.popleft()
+
+    def _measured_fps(self):
+        # Frame rate the frames actually arrived at, from the buffered timestamps
+        if len(self._recent) < 2:
+            return None
+        span = self._recent[-1][0] - self._recent[0][0]
+        return (len(self._recent) - 1) / span if span > 0 else None
+
+    def _close_clip(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        self._clip_until = None
+        self._pending_clip = None
+
+    def _handle(self, item):
+        import cv2
+
+        kind, a, b = item
+        if kind == 'snapshot':
+            cv2.imwrite(a, b)
+        elif kind == 'event':
+            if self.pre is None:
+                return
+            if self._writer is None:
+                os.makedirs(self.clip_dir, exist_ok=True)
+                now = time.time()
+                stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(now)) + f'_{int(now * 1000) % 1000:03d}'
+                path = os.path.join(self.clip_dir, f"{stamp}_{b}{os.path.splitext(self.path)[1] or '.avi'}")
+                self.clips.append(path)
+                if self._recent:
+                    fps = self._measured_fps()
+                    for i, (_, jpeg) in enumerate(self._recent):
+                        frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+                        if i == 0:
+                            self._writer = self._open(path, frame, fps)
+                        self._writer.write(frame)
+                        self.written += 1
+                    self._recent.clear()
+                else:
+                    self._pending_clip = path
+            self._clip_until = a + self.post
+        elif kind == 'frame':
+            if self.pre is None:
+                if self._writer is None:
+                    self._writer = self._open(self.path, b)
+            elif self._clip_until is None:
+                self._buffer(a, b)
+                return
+            elif a > self._clip_until:
+                self._close_clip()
+                self._buffer(a, b)
+                return
+            elif self._writer is None:
+                # The event came before any frame was buffered
+                self._writer = self._open(self._pending_clip, b)
+            self._writer.write(b)
+            self.written += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items and not self._stopping:
+                    self._cond.wait()
+                if not self._items:
+                    break
+                item = self._items.popleft()
+            try:
+                self._handle(item)
+            except Exception as e:
+                print(f"Recorder failed to write {item[0]}: {e}")
+        self._close_clip()
+
+    def stop(self):
+        """Writes everything still queued, then closes the video."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._items)
+        return {"written": self.written, "dropped": self.dropped, "queued": queued, "clips": len(self.clips)}
+
+
+def add_record_args(parser):
+    """Adds the shared --record-codec/--record-fps/--record-events options to a parser."""
+    parser.add_argument('--record-codec', help='FourCC codec for recordings (example: "MJPG", "XVID", "mp4v")',
+                        default='MJPG')
+    parser.add_argument('--record-fps', help='Frame rate written to continuous recordings (event clips use the measured rate)',
+                        type=float, default=30)
+    parser.add_argument('--record-events', help='Only save clips from this many seconds before to after each event',
+                        type=float, default=None)
+    return parser
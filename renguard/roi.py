@@ -0,0 +1,41 @@
+# Region of interest over the bin opening.
+#
+# ROIs are given as fractions of the frame (x1, y1, x2, y2), so the same
+# setting works at any camera resolution. Cropping is a NumPy view: no
+# pixels are copied until the model resizes the crop to its input size.
+
+
+def parse_roi(text):
+    """
+    Parses "x1,y1,x2,y2" as fractions of the frame (0-1), e.g.
+    "0.25,0.2,0.75,0.9". Returns None for an empty string (whole frame).
+    """
+    if not text:
+        return None
+    try:
+        x1, y1, x2, y2 = (float(v) for v in text.split(','))
+    except ValueError:
+        raise ValueError(f"ROI must be four comma separated fractions (x1,y1,x2,y2), got '{text}'")
+    if not (0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1):
+        raise ValueError(f"ROI corners must be fractions between 0 and 1 with x1 < x2 and y1 < y2, got '{text}'")
+    return x1, y1, x2, y2
+
+
+def roi_bounds(shape, roi):
+    """Pixel bounds (x1, y1, x2, y2) of roi in a frame of the given shape."""
+    h, w = shape[:2]
+    if roi is None:
+        return 0, 0, w, h
+    x1, y1, x2, y2 = roi
+    return int(x1 * w), int(y1 * h), int(x2 * w), int(y2 * h)
+
+
+def crop(frame, roi):
+    """
+    Returns (view, (x, y)): the ROI of frame and its top-left corner, which
+    is the offset that maps boxes found in the crop back to the full frame.
+    """
+    if roi is None:
+        return frame, (0, 0)
+    x1, y1, x2, y2 = roi_bounds(frame.shape, roi)
+    return frame[y1:y2, x1:x2], (x1, y1)
@@ -0,0 +1,191 @@
+# Servo drivers shared by the sorter scripts. GPIO libraries are imported
+# lazily so the package can be used on machines without them.
+#
+# Every driver has the same interface: write(joint, angle) starts moving
+# 'base' or 'drop' without waiting, release(joint) stops the pulses once a
+# move is done, and close() frees the hardware. ServoPlanner only talks to
+# that interface, so the backend is picked on the command line.
+
+import time
+from time import sleep
+
+BASE_PIN = 17   # Base rotation
+DROP_PIN = 18   # Drop actuator
+NEUTRAL_DROP = 90
+
+
+class ServoDriver:
+    """Base class for the base/drop servo pair."""
+
+    def write(self, joint, angle):
+        """Starts moving 'base' or 'drop' to angle without waiting for it to get there."""
+        raise NotImplementedError
+
+    def release(self, joint):
+        """Stops the pulses once a move is done. Hardware-timed backends keep holding."""
+
+    def set_base(self, angle):
+        self.write('base', angle)
+
+    def set_drop(self, angle):
+        self.write('drop', angle)
+
+    def sort(self, base_angle, drop_angle):
+        """One full sort cycle with fixed waits: move base, drop, return drop to neutral."""
+        self.set_base(base_angle)
+        sleep(1)
+        self.set_drop(drop_angle)
+        sleep(1)
+        self.set_drop(NEUTRAL_DROP)
+        sleep(0.5)
+
+    def close(self):
+        pass
+
+
+class GPIOServos(ServoDriver):
+    """
+    Base and drop servos driven by RPi.GPIO software PWM at 50 Hz. The
+    pulses are timed by a Python thread, so they jitter when inference
+    loads the CPU.
+    """
+
+    def __init__(self, base_pin=BASE_PIN, drop_pin=DROP_PIN):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        self.pins = (base_pin, drop_pin)
+
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(base_pin, GPIO.OUT)
+        GPIO.setup(drop_pin, GPIO.OUT)
+
+        # Set PWM at 50 Hz (standard for servos)
+        self.base = GPIO.PWM(base_pin, 50)
+        self.drop = GPIO.PWM(drop_pin, 50)
+        self.base.start(0)  # initial duty cycle
+        self.drop.start(0)
+
+    @staticmethod
+    def set_angle(servo, angle):
+        """Maps angle (0–180°) to duty cycle and moves the servo."""
+        duty = 2 + (angle / 18)   # maps 0–180° -> ~2–12% duty cycle
+        servo.ChangeDutyCycle(duty)
+        sleep(0.5)
+        servo.ChangeDutyCycle(0)  # stop sending continuous pulses
+
+    def set_base(self, angle):
+        self.set_angle(self.base, angle)
+
+    def set_drop(self, angle):
+        self.set_angle(self.drop, angle)
+
+    def write(self, joint, angle):
+        getattr(self, joint).ChangeDutyCycle(2 + (angle / 18))
+
+    def release(self, joint):
+        # Without pulses the servo doesn't jitter while idle
+        getattr(self, joint).ChangeDutyCycle(0)
+
+    def close(self):
+        self.base.stop()
+        self.drop.stop()
+        # Only this pair's pins, so other servo pairs in the same process keep running
+        self.GPIO.cleanup(self.pins)
+
+
+def angle_to_value(degrees):
+    """Converts a degree value to the -1 to 1 range for a gpiozero servo."""
+    return (degrees / 90.0) - 1
+
+
+class PigpioServos(ServoDriver):
+    """
+    Base and drop servos driven by gpiozero with the pigpio pin factory.
+    The pigpio daemon (sudo pigpiod) times the pulses with DMA, so they
+    stay jitter-free under CPU load.
+    """
+
+    def __init__(self, base_pin=BASE_PIN, drop_pin=DROP_PIN):
+        from gpiozero import Servo
+        from gpiozero.pins.pigpio import PiGPIOFactory
+
+        factory = PiGPIOFactory()
+        self.base = Servo(base_pin, pin_factory=factory)
+        self.drop = Servo(drop_pin, pin_factory=factory)
+
+    def write(self, joint, angle):
+        getattr(self, joint).value = angle_to_value(angle)
+
+    def close(self):
+        self.base.close()
+        self.drop.close()
+
+
+class SimClock:
+    """
+    Simulated time for replaying the sort cycle faster than real time:
+    sleep() advances the clock instantly.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def advance_to(self, t):
+        """Moves the clock forward to t (never backwards)."""
+        self.now = max(self.now, t)
+
+
+class SimulatedServos(ServoDriver):
+    """
+    No hardware: records every command as (time, joint, angle), with angle
+    None for a release. Lets the whole sort pipeline run and be benchmarked
+    on any machine.
+    """
+
+    def __init__(self, base_pin=BASE_PIN, drop_pin=DROP_PIN, clock=time.perf_counter):
+        self.clock = clock
+        self.commands = []
+        self.position = {'base': None, 'drop': None}
+
+    def write(self, joint, angle):
+        self.commands.append((self.clock(), joint, angle))
+        self.position[joint] = angle
+
+    def release(self, joint):
+        self.commands.append((self.clock(), joint, None))
+
+    def moves(self, joint=None):
+        """The commanded (time, joint, angle) moves, optionally for one joint."""
+        return [c for c in self.commands if c[2] is not None and (joint is None or c[1] == joint)]
+
+
+# Backends selectable with --servo-driver
+DRIVERS = {
+    'pigpio': PigpioServos,
+    'gpio': GPIOServos,
+    'sim': SimulatedServos,
+}
+
+
+def open_servos(driver='pigpio', base_pin=BASE_PIN, drop_pin=DROP_PIN):
+    """Creates the named servo driver."""
+    if driver not in DRIVERS:
+        raise ValueError(f"Unknown servo driver '{driver}'. Choose from: {', '.join(DRIVERS)}")
+    return DRIVERS[driver](base_pin, drop_pin)
+
+
+def add_servo_args(parser, default='pigpio'):
+    """Adds the shared --servo-driver/--servo-speed/--drop-hold options to a parser."""
+    parser.add_argument('--servo-driver', help='pigpio (hardware-timed, needs sudo pigpiod), gpio (RPi.GPIO software PWM) or sim (no hardware)',
+                        choices=list(DRIVERS), default=default)
+    parser.add_argument('--servo-speed', help='Calibrated servo speed under load, in degrees per second',
+                        type=float, default=250.0)
+    parser.add_argument('--drop-hold', help='Seconds the drop stays open for the item to fall',
+                        type=float, default=0.5)
+    return parser
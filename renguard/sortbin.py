@@ -0,0 +1,112 @@
+# One chute's sort logic: tracker -> votes -> log -> servos -> evidence.
+#
+# detect.py, detectserv.py, detectweb.py and renguard.multibin all turn
+# frames into sorts through Bin.handle(), so a change to that path is made
+# once. What a script does on top of a sort (upload it, push it to a
+# dashboard, start a clip) goes in its on_sort callback.
+
+from collections import Counter
+
+from renguard.actuator import SortingQueue
+from renguard.core import MATERIAL_ACTIONS
+from renguard.decision import engine_from_args
+from renguard.motion import gate_from_args
+from renguard.planner import ServoPlanner
+from renguard.roi import parse_roi
+from renguard.servos import BASE_PIN, DROP_PIN, open_servos
+from renguard.tracker import Tracker
+
+
+class Bin:
+    """
+    One chute: its servo pair, gate, ROI, tracker, decision engine, planner
+    and sorter queue, plus an optional detection log, evidence writer and
+    camera (renguard.multibin reads cameras itself; the scripts use
+    iter_frames). on_sort(frame, decision, queued) runs after each sort is
+    handed to the sorter.
+    """
+
+    def __init__(self, servos, planner, sorter, tracker, decider, name=None, gate=None, roi=None, log=None,
+                 evidence=None, device=None, camera=None, on_sort=None):
+        self.servos = servos
+        self.planner = planner
+        self.sorter = sorter
+        self.tracker = tracker
+        self.decider = decider
+        self.name = name
+        self.gate = gate
+        self.roi = roi
+        self.log = log
+        self.evidence = evidence
+        self.device = device
+        self.camera = camera
+        self.on_sort = on_sort
+        self.item_counts = Counter()
+
+    def start(self):
+        self.sorter.start()
+        if self.camera is not None:
+            self.camera.start()
+        return self
+
+    def handle(self, frame):
+        """Tracks, votes and sorts for one core.Frame. Returns the Decisions committed on it."""
+        self.tracker.update(frame.detections)
+        if self.log:
+            self.log.write_frame(frame.index, frame.detections, self.tracker.detection_ids)
+        decisions = self.decider.update(frame.detections, self.tracker.detection_ids, self.tracker.active_ids)
+        for decision in decisions:
+            material = decision.material
+            self.item_counts[material] += 1
+            if self.log:
+                self.log.write_item(frame.index, decision)
+            base_angle, drop_angle = MATERIAL_ACTIONS[material]
+            prefix = f"[{self.name}] " if self.name else "\n"
+            print(f"{prefix}Sorting: {material} (item {decision.id}, {decision.reason} after "
+                  f"{decision.latency * 1000:.0f} ms) → Base {base_angle}°, Drop {drop_angle}°")
+
+            # Hand the servo cycle to the sorter thread so inference keeps running
+            queued = self.sorter.submit(material, base_angle, drop_angle)
+            if self.evidence:
+                # The ROI crop and box behind this decision, saved in the background
+                self.evidence.add_decision(frame, decision, self.tracker, self.roi, device=self.device)
+            if self.on_sort is not None:
+                self.on_sort(frame, decision, queued)
+        return decisions
+
+    def stats(self):
+        stats = {"items": dict(self.item_counts), "sorter": self.sorter.stats(), "servo": self.planner.stats(),
+                 "decisions": self.decider.stats()}
+        if self.gate:
+            stats["motion_gate"] = self.gate.stats()
+        if self.camera is not None:
+            stats["camera_dropped"] = self.camera.dropped
+        return stats
+
+    def close(self):
+        """Stops the camera and sorter, parks the servos and closes the log (not the shared evidence writer)."""
+        if self.camera is not None:
+            self.camera.stop()
+        self.sorter.stop()
+        self.planner.idle()
+        self.servos.close()
+        if self.log:
+            self.log.close()
+
+
+def open_bin(args, metrics=None, name=None, base_pin=BASE_PIN, drop_pin=DROP_PIN, **kwargs):
+    """
+    Builds a Bin from the shared command-line options (motion gate, ROI,
+    voting, servo driver). Other Bin arguments (log, evidence, camera,
+    on_sort, ...) are passed through. The sorter is started by Bin.start().
+    """
+    servos = open_servos(args.servo_driver, base_pin, drop_pin)
+    try:
+        # Skips moves to where a servo already is and overlaps the drop reset with the next base move
+        planner = ServoPlanner(servos, speed=args.servo_speed, drop_hold=args.drop_hold)
+        return Bin(servos, planner, SortingQueue(planner.sort, maxsize=4, metrics=metrics, idle_fn=planner.idle),
+                   Tracker(iou_threshold=0.3, min_hits=3, max_age=10), engine_from_args(args, metrics),
+                   name=name, gate=gate_from_args(args), roi=parse_roi(args.roi), **kwargs)
+    except Exception:
+        servos.close()
+        raise
@@ -0,0 +1,130 @@
+# Online object tracker so each physical item is counted and sorted once.
+
+from collections import Counter
+
+
+def iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter <= 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / (area_a + area_b - inter)
+
+
+def centroid_distance(a, b):
+    """Distance between box centres, relative to the diagonal of box a."""
+    ax, ay = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+    bx, by = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    diag = ((a[2] - a[0]) ** 2 + (a[3] - a[1]) ** 2) ** 0.5 or 1.0
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / diag
+
+
+class Track:
+    """One physical item followed across frames."""
+
+    def __init__(self, track_id, box, material, conf):
+        self.id = track_id
+        self.box = box
+        self.hits = 1
+        self.misses = 0
+        self.confirmed = False
+        self.votes = Counter({material: conf})
+
+    @property
+    def material(self):
+        # The label with the highest accumulated confidence wins, so a single
+        # misclassified frame does not change what the item is
+        return self.votes.most_common(1)[0][0]
+
+    @property
+    def score(self):
+        """Confidence-weighted support for the winning material, 0-1."""
+        return self.votes[self.material] / self.hits
+
+    def update(self, box, material, conf):
+        self.box = box
+        self.hits += 1
+        self.misses = 0
+        self.votes[material] += conf
+
+
+class Tracker:
+    """
+    Associates detections between frames by IoU, falling back to centroid
+    distance for items that move fast between frames.
+
+    A track is confirmed after min_hits matched frames and is forgotten after
+    max_age frames without a match. update() returns each track exactly once,
+    on the frame it gets confirmed, so callers can count and sort per item
+    instead of per box per frame.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_distance=0.5, min_hits=3, max_age=10):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.min_hits = min_hits
+        self.max_age = max_age
+        self.tracks = []
+        self.next_id = 1
+        # Track id of each detection passed to the last update()
+        self.detection_ids = []
+
+    @property
+    def active_ids(self):
+        """Ids of the tracks still being followed."""
+        return {track.id for track in self.tracks}
+
+    def update(self, detections):
+        """
+        detections: list of (box, material, conf) for the current frame,
+        with box as (x1, y1, x2, y2).
+
+        Returns the list of tracks confirmed on this frame.
+        """
+        # Score every track/detection pair that is close enough to match
+        candidates = []
+        for ti, track in enumerate(self.tracks):
+            for di, (box, _, _) in enumerate(detections):
+                overlap = iou(track.box, box)
+                if overlap >= self.iou_threshold:
+                    candidates.append((overlap, 0.0, ti, di))
+                else:
+                    dist = centroid_distance(track.box, box)
+                    if dist <= self.max_distance:
+                        candidates.append((overlap, dist, ti, di))
+
+        # Greedy assignment: best overlap first, then closest centre
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+        matched_tracks, matched_dets = set(), set()
+        self.detection_ids = [None] * len(detections)
+        for _, _, ti, di in candidates:
+            if ti in matched_tracks or di in matched_dets:
+                continue
+            matched_tracks.add(ti)
+            matched_dets.add(di)
+            self.tracks[ti].update(*detections[di])
+            self.detection_ids[di] = self.tracks[ti].id
+
+        # Age out tracks that were not seen this frame
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_age]
+
+        # Unmatched detections start new tentative tracks
+        for di, (box, material, conf) in enumerate(detections):
+            if di not in matched_dets:
+                self.tracks.append(Track(self.next_id, box, material, conf))
+                self.detection_ids[di] = self.next_id
+                self.next_id += 1
+
+        confirmed = []
+        for track in self.tracks:
+            if not track.confirmed and track.hits >= self.min_hits:
+                track.confirmed = True
+                confirmed.append(track)
+        return confirmed
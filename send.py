@@ -1,53 +1,77 @@
-import requests
-import re
+import argparse
+import socket
 import time
-import json
+from collections import Counter
+from renguard.eventlog import parse_line
+from renguard.follow import LogFollower
+from renguard.ingest import IngestClient
 
-def send_data():
+# The URL for the receiving endpoint on the server
+SERVER_URL = "http://localhost:5000/ingest"
+DEVICE = f"{socket.gethostname()}-send"
+
+def sync(follower, client):
     """
-    Reads the detected.txt file, parses the final counts, and sends
-    them to the web server.
+    Reads only the lines added to detected.txt since the last run, counts the new
+    sorted items (the I records, one per tracked item) and queues them in the
+    client's outbox as one delta for the web server. Returns the counts added by this sync.
     """
-    # Wait a moment to ensure the file has been written by detect.py
-    time.sleep(2)
-    
+    lines = follower.poll()
+    if not lines:
+        return {}
+
+    delta = Counter()
+    for line in lines:
+        record = parse_line(line)
+        if record is not None and record[0] == 'I':
+            delta[record[4]] += 1
+
+    if delta:
+        print(f"Queueing data for server: {dict(delta)}")
+        # Queued on disk before the position is saved, so a crash can't lose these counts
+        client.add_counts(delta)
+
+    follower.save()
+    return dict(delta)
+
+def send_data(follow=False, interval=0.5, file_path='detected.txt', server_url=SERVER_URL):
+    """
+    Sends new items from detected.txt to the web server, parsing only new
+    lines. With follow=True, keeps tailing the log and pushes updates as they arrive.
+    """
+    # Separate saved position from sendtv.py so both can be used on the same log
+    follower = LogFollower(file_path, state_path=f"{file_path}.send.state")
+    client = IngestClient(server_url, DEVICE, outbox_path=f"{file_path}.send.outbox")
+
+    if not follow:
+        if not sync(follower, client):
+            print("No new items found in detected.txt.")
+        # Also sends anything left over from earlier runs
+        if client.flush():
+            print("Data successfully sent to the server.")
+        else:
+            print(f"{client.pending()} updates are queued and will be sent on the next run.")
+        client.close()
+        return
+
+    print(f"Following {file_path}... Press Ctrl+C to stop.")
+    client.start()
     try:
-        with open('detected.txt', 'r') as f:
-            lines = f.readlines()
-
-        # Find the summary section at the end of the file
-        summary_start = -1
-        for i, line in enumerate(lines):
-            if "Summary of detected materials:" in line:
-                summary_start = i + 1
-                break
-        
-        if summary_start == -1:
-            print("Could not find summary data in detected.txt.")
-            return
-
-        material_counts = {}
-        for line in lines[summary_start:]:
-            match = re.search(r"(\w+): (\d+)", line)
-            if match:
-                material = match.group(1)
-                count = int(match.group(2))
-                material_counts[material] = count
-
-        # The URL for the receiving endpoint on the server
-        server_url = "http://localhost:5000/post_data"
-
-        print(f"Sending data to server: {material_counts}")
-        response = requests.post(server_url, json=material_counts)
-        response.raise_for_status() # Raise an exception for bad status codes
-        print("Data successfully sent to the server.")
-
-    except FileNotFoundError:
-        print("Error: detected.txt not found. Did you run detect.py first?")
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to send data to the server: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        while True:
+            sync(follower, client)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped following.")
+    finally:
+        left = client.stop()
+        if left:
+            print(f"{left} updates are queued and will be sent on the next run.")
 
 if __name__ == '__main__':
-    send_data()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--follow', help='Keep tailing detected.txt and push new counts as they arrive', action='store_true')
+    parser.add_argument('--interval', help='Seconds between checks in follow mode', type=float, default=0.5)
+    parser.add_argument('--file', help='Detection log to read', default='detected.txt')
+    parser.add_argument('--server', help='Server endpoint to post counts to', default=SERVER_URL)
+    args = parser.parse_args()
+    send_data(args.follow, args.interval, args.file, args.server)
@@ -1,92 +1,130 @@
-import requests
-import re
+import argparse
+import socket
 import time
 from collections import Counter
+from renguard.core import MATERIALS
+from renguard.eventlog import iter_frame_materials
+from renguard.follow import LogFollower
+from renguard.ingest import IngestClient
 
-def parse_and_deduplicate_data(file_path='detected.txt'):
-    """
-    Reads the detected.txt file, parses the list of materials detected per frame,
-    and applies a de-duplication logic: counts a material only once after a 
-    'break' (a frame with no valid detection).
-    
-    Returns a dictionary of final, de-duplicated counts.
+# The URL for the receiving endpoint on the server
+SERVER_URL = "http://localhost:5000/ingest"
+DEVICE = f"{socket.gethostname()}-sendtv"
+
+def deduplicate(frames, final_counts, last_detected_material=None):
     """
-    try:
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        print("Error: detected.txt not found. Did you run detect.py first?")
-        return {}
+    Applies the de-duplication logic to (frame, materials) pairs: counts a material
+    only once after a 'break' (a frame with no valid detection).
 
-    final_counts = Counter()
-    # State variable to track the material seen in the previous frame
-    # We use 'None' to represent a "space" (empty frame/no valid detection)
-    last_detected_material = None
-    
+    Adds to final_counts in place and returns the last detected material, so the
+    state can be carried over to the next batch of frames.
+    """
     # Define valid materials that should be counted
-    valid_materials = {"Cardboard", "Plastic", "Glass", "Tin"}
-
-    for line in lines:
-        # Extract the list of materials detected in the current frame from a line like "Frame 1: Cardboard"
-        match = re.search(r"Frame \d+: (.*)", line)
-        if not match:
-            # If the line doesn't match the expected format, treat it as a break
-            current_frame_material = None
-        else:
-            # Clean and split the comma-separated materials
-            materials_list = [m.strip() for m in match.group(1).split(',') if m.strip()]
-            
-            # Find the single most relevant material detected in the current frame
-            # This logic assumes the first detected item is the one we care about for counting
-            current_frame_material = next((m for m in materials_list if m in valid_materials), None)
-        
+    valid_materials = set(MATERIALS)
+
+    for _, materials_list in frames:
+        # Find the single most relevant material detected in the current frame
+        # This logic assumes the first detected item is the one we care about for counting
+        current_frame_material = next((m for m in materials_list if m in valid_materials), None)
+
         #  De-duplication Logic
         # if A valid material is detected in the current frame
         if current_frame_material and current_frame_material in valid_materials:
-            
+
             # If the detected material is DIFFERENT from the one in the previous frame (or if the previous was 'None'),
             # then this is considered a new, successfully introduced item.
             if current_frame_material != last_detected_material:
                 final_counts[current_frame_material] += 1
-            
+
             # Update the state to the currently detected material
             last_detected_material = current_frame_material
-            
+
         # if No valid material is detected (e.g., empty frame, or 'Unknown')
         else:
             # This creates the "space" or pause, allowing the next item, even if it's the same type, to be counted.
             last_detected_material = None
-                
+
+    return last_detected_material
+
+def parse_and_deduplicate_data(file_path='detected.txt'):
+    """
+    Reads the whole detected.txt file, parses the list of materials detected per frame,
+    and applies the de-duplication logic.
+
+    Returns a dictionary of final, de-duplicated counts.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            final_counts = Counter()
+            # Rebuild the materials seen in each frame from the log records (empty runs count as a break)
+            deduplicate(iter_frame_materials(f), final_counts)
+    except FileNotFoundError:
+        print("Error: detected.txt not found. Did you run detect.py first?")
+        return {}
+
     return dict(final_counts)
 
-def send_data():
+def sync(follower, client):
+    """
+    Parses only the lines added to the log since the last sync, carrying the
+    de-duplication state (last_detected_material) across runs. Queues the new
+    counts in the client's outbox as one delta for the server.
+
+    Returns the counts added by this sync.
+    """
+    lines = follower.poll()
+    if not lines:
+        return {}
+
+    state = follower.state
+    delta = Counter()
+    state["last_detected_material"] = deduplicate(iter_frame_materials(lines), delta,
+                                                  state.get("last_detected_material"))
+
+    if delta:
+        print(f"Queueing de-duplicated counts for server: {dict(delta)}")
+        # Queued on disk before the position is saved, so a crash can't lose these counts
+        client.add_counts(delta)
+
+    follower.save()
+    return dict(delta)
+
+def send_data(follow=False, interval=0.5, file_path='detected.txt', server_url=SERVER_URL):
     """
-    Calls the parsing function and sends the de-duplicated counts to the web server.
+    Sends the de-duplicated counts to the web server. Only lines appended to the
+    log since the last run are parsed. With follow=True, keeps tailing the log
+    and pushes updates as they arrive.
     """
-    # Wait a moment to ensure the file has been written by detect.py
-    # This wait time may need adjustment depending on how long detect.py runs
-    print("Waiting 2 seconds to ensure detect.py has finished writing the file...")
-    time.sleep(2)
-    
-    data_to_send = parse_and_deduplicate_data()
-    
-    if not data_to_send:
-        print("No valid material data was found or counted. Nothing sent.")
-        return
+    follower = LogFollower(file_path)
+    client = IngestClient(server_url, DEVICE, outbox_path=f"{file_path}.outbox")
 
-    # The URL for the receiving endpoint on the server
-    server_url = "http://localhost:5000/post_data"
+    if not follow:
+        if not sync(follower, client):
+            print("No new material data was found or counted.")
+        # Also sends anything left over from earlier runs
+        if not client.flush():
+            print(f"Is server.py running? {client.pending()} updates are queued and will be sent on the next run.")
+        client.close()
+        return
 
+    print(f"Following {file_path}... Press Ctrl+C to stop.")
+    client.start()
     try:
-        print(f"Sending de-duplicated counts to server: {data_to_send}")
-        response = requests.post(server_url, json=data_to_send)
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-        print("Data successfully sent to the server.")
-
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to send data to the server (Is dashboard_server.py running?): {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        while True:
+            sync(follower, client)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped following.")
+    finally:
+        left = client.stop()
+        if left:
+            print(f"{left} updates are queued and will be sent on the next run.")
 
 if __name__ == '__main__':
-    send_data()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--follow', help='Keep tailing detected.txt and push new counts as they arrive', action='store_true')
+    parser.add_argument('--interval', help='Seconds between checks in follow mode', type=float, default=0.5)
+    parser.add_argument('--file', help='Detection log to read', default='detected.txt')
+    parser.add_argument('--server', help='Server endpoint to post counts to', default=SERVER_URL)
+    args = parser.parse_args()
+    send_data(args.follow, args.interval, args.file, args.server)
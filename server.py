@@ -1,48 +1,205 @@
-# This program runs the web server and stores the data from the detector.
+# This program runs the web server and stores the data from the detectors.
+#
+# RENGUARD_EVIDENCE sets the evidence folder served under /evidence (default
+# "evidence", the detectors' --evidence default).
 
-from flask import Flask, jsonify, request
+import os
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
+from renguard.counters import CounterStore, json_response
+from renguard.events import EventBroadcaster
+from renguard.evidence import EvidenceArchive
+from renguard.history import HistoryStore
+from renguard.ingest import IngestError, IngestLedger, decode_body, parse_payload
 
-# Global variable to store the latest material counts received from the detector
-material_counts = {
+# Every sort event, with hourly/daily rollups, survives restarts here
+history = HistoryStore('history.db')
+
+# The image behind each sort, written by the detectors running on this machine; opened read-only,
+# so the server never creates or migrates the index a live detector is writing
+evidence = EvidenceArchive(os.environ.get('RENGUARD_EVIDENCE', 'evidence'), readonly=True)
+
+# Global material counts across every detector, restored from the history.
+# Updates are atomic and readers get an immutable snapshot without taking a lock.
+material_counts = CounterStore({
     "Plastic": 0,
     "Cardboard": 0,
     "Glass": 0,
-    "Tin": 0
-}
+    "Tin": 0,
+    **history.totals()
+})
+
+# Per-device totals and de-duplication of retried batches by (device, seq)
+ledger = IngestLedger(material_counts)
+ledger.restore(history.devices())
+
+# Pushes every change to the global counts to connected dashboards, resyncing any that fall behind
+events = EventBroadcaster().track(material_counts)
 
 # Flask App setup
 app = Flask(__name__)
 CORS(app)  # Enable CORS for the web page
 
-# API endpoint to receive data from the separate detector program
+# API endpoint for detectors to post batches of count deltas and sort events
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    """
+    Receives {"device": name, "stream": id, "entries": [{"seq": n, "counts": {...}} or {"seq": n, "material": m}, ...]}.
+    Entries already applied for this (device, stream, seq) are skipped, so retries are safe.
+    """
+    try:
+        # Detectors gzip large batches
+        device, stream, entries = parse_payload(decode_body(request.get_data(), request.content_encoding))
+    except IngestError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    # Seqs only count as applied once they are in history.db; if that write fails the retry goes through
+    accepted, duplicates, _, sorted_items = ledger.apply(device, entries, stream, persist=history.record_ingest)
+    for item in sorted_items:
+        events.publish("sort", item)
+    return jsonify({"status": "success", "accepted": accepted, "duplicates": duplicates}), 200
+
+# API endpoint for the per-device totals
+@app.route('/devices')
+def get_devices():
+    """Returns each detector's totals, last applied seq and last contact time."""
+    return jsonify(ledger.device_summary())
+
+# API endpoint to receive running totals from older detector programs
 @app.route('/post_data', methods=['POST'])
 def post_data():
     """
-    Receives a JSON payload from the detector and updates the global counts.
+    Receives a detector's running totals. Only the change since that detector's
+    previous post is added, so several detectors no longer overwrite each other.
+    Pass ?device=name to tell detectors on the same host apart.
     """
-    global material_counts
     try:
         data = request.json
         if data:
-            material_counts = data
-            print(f"Received new data from detector: {material_counts}")
+            device = request.args.get('device', request.remote_addr)
+            ledger.set_totals(device, data, persist=history.record_ingest)
+            print(f"Received new data from {device}: {data}")
             return jsonify({"status": "success", "message": "Data received"}), 200
         else:
             return jsonify({"status": "error", "message": "No data received"}), 400
+    except IngestError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# Latest per-stage latency stats reported by each detector, keyed by device name
+device_metrics = {}
+
+# API endpoint to receive latency stats from a detector
+@app.route('/post_metrics', methods=['POST'])
+def post_metrics():
+    """
+    Receives {"device": name, "stages": {...}} from a detector's Metrics.summary().
+    """
+    data = request.json
+    if not data or "stages" not in data:
+        return jsonify({"status": "error", "message": "No metrics received"}), 400
+    device_metrics[data.get("device", request.remote_addr)] = data["stages"]
+    return jsonify({"status": "success", "message": "Metrics received"}), 200
+
+# API endpoint to view the latency stats of every detector
+@app.route('/metrics')
+def get_metrics():
+    """Returns the latest stage latency stats for each detector."""
+    return jsonify(device_metrics)
+
 # API endpoint for the web dashboard to get the latest data
+# (/data is what dashboard.html and detectweb.py use, /get_data is kept for older clients)
+@app.route('/data')
 @app.route('/get_data')
 def get_data():
     """
     Returns the current material counts as a JSON response for the dashboard.
     """
-    print(f"Dashboard requested data. Sending: {material_counts}")
-    return jsonify(material_counts)
+    return json_response(material_counts)
+
+# Optional float/int query argument; raises ValueError for bad input
+def _query_number(name, kind=float):
+    value = request.args.get(name)
+    return None if value in (None, '') else kind(value)
+
+# API endpoint for count history, e.g. /history?interval=day&material=Glass&group_by=device
+@app.route('/history')
+def get_history():
+    """
+    Counts per hour or day from the rollups. Optional arguments: interval
+    (hour/day), start and end (epoch seconds), device, material and
+    group_by (material/device/both).
+    """
+    try:
+        rows = history.series(interval=request.args.get('interval', 'hour'),
+                              start=_query_number('start'), end=_query_number('end'),
+                              device=request.args.get('device'), material=request.args.get('material'),
+                              group_by=request.args.get('group_by', 'material'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(rows)
+
+# API endpoint for all-time totals per bin (device) and material
+@app.route('/history/totals')
+def get_history_totals():
+    """Returns {device: {material: count}} over the whole history."""
+    return jsonify({device: saved["counts"] for device, saved in history.devices().items()})
+
+# API endpoint for the latest raw sort events
+@app.route('/history/events')
+def get_history_events():
+    """Returns the newest sort events, optionally for one device (?device=, ?limit=)."""
+    try:
+        limit = min(_query_number('limit', int) or 100, 1000)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(history.recent(limit, request.args.get('device')))
+
+# API endpoint to look up sort evidence, e.g. /evidence?material=Glass&start=1700000000
+@app.route('/evidence')
+def get_evidence():
+    """
+    Metadata of the newest evidence, with links to the image and its
+    thumbnail. Optional arguments: start and end (epoch seconds), material,
+    device and limit.
+    """
+    try:
+        limit = min(_query_number('limit', int) or 100, 1000)
+        rows = evidence.query(start=_query_number('start'), end=_query_number('end'),
+                              material=request.args.get('material'), device=request.args.get('device'), limit=limit)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    for row in rows:
+        row["image"] = f"/evidence/{row['id']}.jpg"
+        row["thumb"] = f"/evidence/{row['id']}/thumb.jpg"
+    return jsonify(rows)
+
+# Evidence images are read straight from the archive with one seek, never decoded
+@app.route('/evidence/<int:evidence_id>.jpg')
+@app.route('/evidence/<int:evidence_id>/thumb.jpg', endpoint='get_evidence_thumb', defaults={'thumb': True})
+def get_evidence_image(evidence_id, thumb=False):
+    """Returns one evidence JPEG (or its thumbnail), or 404 once it has been evicted."""
+    data = evidence.read(evidence_id, thumb=thumb)
+    if data is None:
+        return jsonify({"status": "error", "message": "Evidence not found"}), 404
+    response = Response(data, mimetype='image/jpeg')
+    # An id always refers to the same image, so browsers can keep it
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+# Live stream for dashboards: current totals on connect, then every change as it happens
+@app.route('/stream')
+def stream():
+    """Server-Sent Events stream: one "counts" snapshot, then "delta" events."""
+    response = Response(stream_with_context(events.stream()),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 # Run the Flask app
 if __name__ == '__main__':
     # Run on all available network interfaces on port 5000
-    app.run(host='0.0.0.0', port=5000)
+    # threaded so each live dashboard stream gets its own thread
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -5,8 +5,14 @@ import glob
 import time
 
 import cv2
-import numpy as np
-from ultralytics import YOLO
+from renguard.batch import list_images, run_batch
+from renguard.core import MATERIALS, ClassTable, add_model_args, check_model_args, load_model
+from renguard.metrics import Metrics, RingBuffer, add_metrics_args
+from renguard.motion import add_motion_args, gate_from_args
+from renguard.pipeline import Pipeline
+from renguard.recorder import AsyncRecorder, add_record_args
+from renguard.postprocess import EMPTY, count_materials, filter_conf, material_lookup, scale_boxes, shift_boxes, to_arrays
+from renguard.roi import crop, parse_roi, roi_bounds
 
 # Define and parse user input arguments
 
@@ -17,14 +23,21 @@ parser.add_argument('--source', help='Image source, can be image file ("test.jpg
                     image folder ("test_dir"), video file ("testvid.mp4"), or index of USB camera ("usb0")', 
                     required=True)
 parser.add_argument('--thresh', help='Minimum confidence threshold for displaying detected objects (example: "0.4")',
-                    default=0.5)
+                    type=float, default=0.5)
 parser.add_argument('--resolution', help='Resolution in WxH to display inference results at (example: "640x480"), \
                     otherwise, match source resolution',
                     default=None)
-parser.add_argument('--record', help='Record results from video or webcam and save it as "demo1.avi". Must specify --resolution argument to record.',
+parser.add_argument('--record', help='Record results from video or camera sources and save it as "demo1.avi" (or clips/ with --record-events)',
                     action='store_true')
+parser.add_argument('--batch', help='Run headless over an image folder in batches of this size (example: "16") and save results to --output',
+                    type=int, default=0)
+parser.add_argument('--output', help='JSON Lines file for --batch results', default='results.jsonl')
+add_model_args(parser, model_default=None) # --backend, --precision and --imgsz
+add_metrics_args(parser) # --metrics and --metrics-interval
+add_motion_args(parser, default=False) # --gate, --roi, --motion-threshold and --cooldown
+add_record_args(parser) # --record-codec, --record-fps and --record-events
 
-args = parser.parse_args()
+args = check_model_args(parser, parser.parse_args())
 
 
 # Parse user inputs
@@ -40,9 +53,12 @@ if (not os.path.exists(model_path)):
     sys.exit(0)
 
 # Load the model into memory and get labemap
-model = YOLO(model_path, task='detect')
+model = load_model(model_path, args.backend, args.precision)
 labels = model.names
 
+# Class id -> material index array, so per-frame material counting is a single bincount
+material_ids = material_lookup(ClassTable(labels))
+
 # Parse input to determine if image source is a file, folder, video, or USB camera
 img_ext_list = ['.jpg','.JPG','.jpeg','.JPEG','.png','.PNG','.bmp','.BMP']
 vid_ext_list = ['.avi','.mov','.mp4','.mkv','.wmv']
@@ -68,6 +84,16 @@ else:
     print(f'Input {img_source} is invalid. Please try again.')
     sys.exit(0)
 
+# Headless batch mode for image folders: no display, results go to a file
+if args.batch:
+    if source_type != 'folder':
+        print('Batch mode only works with an image folder source. Please try again.')
+        sys.exit(0)
+    done, elapsed = run_batch(model, list_images(img_source), args.output, batch_size=args.batch,
+                              imgsz=args.imgsz, conf=min_thresh)
+    print(f'Processed {done} images in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f} images/sec). Results saved to {args.output}.')
+    sys.exit(0)
+
 # Parse user-specified display resolution
 resize = False
 if user_res:
@@ -76,17 +102,15 @@ if user_res:
 
 # Check if recording is valid and set up recording
 if record:
-    if source_type not in ['video','usb']:
+    if source_type not in ['video','usb','picamera']:
         print('Recording only works for video and camera sources. Please try again.')
         sys.exit(0)
-    if not user_res:
-        print('Please specify resolution to record video at.')
-        sys.exit(0)
-    
-    # Set up recording
-    record_name = 'demo1.avi'
-    record_fps = 30
-    recorder = cv2.VideoWriter(record_name, cv2.VideoWriter_fourcc(*'MJPG'), record_fps, (resW,resH))
+
+# Recording and 'p' snapshots are encoded and written on a background thread, so a slow disk never stalls
+# the render loop; if it falls behind, the oldest queued frames are dropped. The video size follows the
+# displayed frames. With --record-events N, only the N seconds around frames with detections are kept.
+recorder = AsyncRecorder('demo1.avi' if record else None, fps=args.record_fps, codec=args.record_codec,
+                         pre=args.record_events, post=args.record_events or 2.0).start()
 
 # Load or initialize image source
 if source_type == 'image':
@@ -110,97 +134,127 @@ elif source_type == 'video' or source_type == 'usb':
         ret = cap.set(4, resH)
 
 elif source_type == 'picamera':
-    from picamera2 import Picamera2
-    cap = Picamera2()
-    cap.configure(cap.create_video_configuration(main={"format": 'XRGB8888', "size": (resW, resH)}))
-    cap.start()
+    # 3-channel BGR frames straight from the camera, copied once into a reused ring of buffers
+    from renguard.camera import PicameraSource
+    cap = PicameraSource(size=(resW, resH) if user_res else (1280, 720), index=picam_idx,
+                         slots=Pipeline.frames_in_flight(latest=True))
 
 # Set bounding box colors (using the Tableu 10 color scheme)
 bbox_colors = [(164,120,87), (68,148,228), (93,97,209), (178,182,133), (88,159,106), 
               (96,202,231), (159,124,168), (169,162,241), (98,118,150), (172,176,184)]
 
-# Initialize control and status variables
-avg_frame_rate = 0
-frame_rate_buffer = []
-fps_avg_len = 200
-img_count = 0
+# Frame readers for each source type. Each returns the next raw frame, or None at the end of the source.
+img_iter = iter(imgs_list) if source_type in ['image','folder'] else None
 
-# Begin inference loop
-while True:
-
-    t_start = time.perf_counter()
-
-    # Load frame from image source
+def read_frame():
     if source_type == 'image' or source_type == 'folder': # If source is image or image folder, load the image using its filename
-        if img_count >= len(imgs_list):
-            print('All images have been processed. Exiting program.')
-            sys.exit(0)
-        img_filename = imgs_list[img_count]
-        frame = cv2.imread(img_filename)
-        img_count = img_count + 1
-    
+        for img_filename in img_iter:
+            frame = cv2.imread(img_filename)
+            if frame is not None:
+                return frame
+            print(f'Unable to read {img_filename}, skipping.')
+        print('All images have been processed. Exiting program.')
+        return None
+
     elif source_type == 'video': # If source is a video, load next frame from video file
         ret, frame = cap.read()
         if not ret:
             print('Reached end of the video file. Exiting program.')
-            break
-    
+            return None
+        return frame
+
     elif source_type == 'usb': # If source is a USB camera, grab frame from camera
         ret, frame = cap.read()
         if (frame is None) or (not ret):
             print('Unable to read frames from the camera. This indicates the camera is disconnected or not working. Exiting program.')
-            break
+            return None
+        return frame
 
     elif source_type == 'picamera': # If source is a Picamera, grab frames using picamera interface
-        frame_bgra = cap.capture_array()
-        frame = cv2.cvtColor(np.copy(frame_bgra), cv2.COLOR_BGRA2BGR)
+        frame = cap.read()
         if (frame is None):
             print('Unable to read frames from the Picamera. This indicates the camera is disconnected or not working. Exiting program.')
-            break
-
-    # Resize frame to desired display resolution
-    if resize == True:
-        frame = cv2.resize(frame,(resW,resH))
+            return None
+        return frame
+
+def preprocess(frame):
+    # Frames stay at full resolution and are already BGR: the model letterboxes the ROI crop
+    # straight to --imgsz, and only the display copy is resized to --resolution
+    return frame
+
+# Optional motion gate for video and camera sources: frames where nothing moves skip the model
+gate = gate_from_args(args) if source_type in ['video','usb','picamera'] else None
+
+# Optional region of interest: only the drop zone is sent to the model
+roi = parse_roi(args.roi)
+
+def infer(frame):
+    if gate is not None and not gate.check(frame):
+        return None
+    # Run inference on the ROI crop (a view, no copy)
+    region, offset = crop(frame, roi)
+    results = model(region, imgsz=args.imgsz, conf=min_thresh, verbose=False)
+    return results[0].boxes, offset
+
+def postprocess(output):
+    if output is None:
+        return EMPTY
+    boxes, offset = output
+    # Convert results to NumPy arrays once per frame (one device copy instead of one per box),
+    # then move the boxes from ROI crop to full-frame coordinates
+    return shift_boxes(filter_conf(to_arrays(boxes), min_thresh), *offset)
+
+# Capture, preprocessing and inference each run on their own thread; drawing, display and recording stay here.
+# Live cameras keep only the newest frame so inference never works on a stale backlog.
+live_source = source_type in ['usb','picamera']
+metrics = Metrics()
+# Picamera ring slots go back to the camera once a frame is dropped as stale or has been rendered
+release = cap.release if source_type == 'picamera' else None
+pipeline = Pipeline(read_frame, preprocess, infer, postprocess, latest=live_source, metrics=metrics,
+                    release_fn=release).start()
 
-    # Run inference on frame
-    results = model(frame, verbose=False)
-
-    # Extract results
-    detections = results[0].boxes
+# Initialize control and status variables
+avg_frame_rate = 0
+fps_avg_len = 200
+frame_rate_buffer = RingBuffer(fps_avg_len)
+t_last = time.perf_counter()
 
-    # Initialize variable for basic object counting example
-    object_count = 0
+# Begin render loop
+for packet in pipeline:
 
-    # Go through each detection and get bbox coords, confidence, and class
-    for i in range(len(detections)):
+    t_start = time.perf_counter()
+    frame = packet.frame
 
-        # Get bounding box coordinates
-        # Ultralytics returns results in Tensor format, which have to be converted to a regular Python array
-        xyxy_tensor = detections[i].xyxy.cpu() # Detections in Tensor format in CPU memory
-        xyxy = xyxy_tensor.numpy().squeeze() # Convert tensors to Numpy array
-        xmin, ymin, xmax, ymax = xyxy.astype(int) # Extract individual coordinates and convert to int
+    # Detections for this frame as arrays (xyxy, conf, cls) in full-frame coordinates, already above --thresh
+    detections = packet.result
 
-        # Get bounding box class ID and name
-        classidx = int(detections[i].cls.item())
+    # Display and recording use a copy at --resolution, with boxes scaled to match
+    if resize == True:
+        frame_h, frame_w = frame.shape[:2]
+        sx, sy = resW / frame_w, resH / frame_h
+        frame = cv2.resize(frame, (resW,resH))
+        detections = scale_boxes(detections, sx, sy)
+    if roi is not None:
+        rx1, ry1, rx2, ry2 = roi_bounds(frame.shape, roi)
+        cv2.rectangle(frame, (rx1,ry1), (rx2,ry2), (255,255,255), 1) # Outline the ROI sent to the model
+
+    # Basic object counting example, per object and per material
+    object_count = len(detections.cls)
+    material_counts = count_materials(material_ids[detections.cls])
+
+    # Draw each detection's box and label
+    boxes = detections.xyxy.astype(int).tolist()
+    for (xmin, ymin, xmax, ymax), classidx, conf in zip(boxes, detections.cls.tolist(), detections.conf.tolist()):
         classname = labels[classidx]
 
-        # Get bounding box confidence
-        conf = detections[i].conf.item()
-
-        # Draw box if confidence threshold is high enough
-        if conf > 0.5:
-
-            color = bbox_colors[classidx % 10]
-            cv2.rectangle(frame, (xmin,ymin), (xmax,ymax), color, 2)
+        color = bbox_colors[classidx % 10]
+        cv2.rectangle(frame, (xmin,ymin), (xmax,ymax), color, 2)
 
-            label = f'{classname}: {int(conf*100)}%'
-            labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1) # Get font size
-            label_ymin = max(ymin, labelSize[1] + 10) # Make sure not to draw label too close to top of window
-            cv2.rectangle(frame, (xmin, label_ymin-labelSize[1]-10), (xmin+labelSize[0], label_ymin+baseLine-10), color, cv2.FILLED) # Draw white box to put label text in
-            cv2.putText(frame, label, (xmin, label_ymin-7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1) # Draw label text
-
-            # Basic example: count the number of objects in the image
-            object_count = object_count + 1
+        label = f'{classname}: {int(conf*100)}%'
+        labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1) # Get font size
+        label_ymin = max(ymin, labelSize[1] + 10) # Make sure not to draw label too close to top of window
+        cv2.rectangle(frame, (xmin, label_ymin-labelSize[1]-10), (xmin+labelSize[0], label_ymin+baseLine-10), color, cv2.FILLED) # Draw white box to put label text in
+        cv2.putText(frame, label, (xmin, label_ymin-7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1) # Draw label text
 
     # Calculate and draw framerate (if using video, USB, or Picamera source)
     if source_type == 'video' or source_type == 'usb' or source_type == 'picamera':
@@ -208,8 +262,14 @@ while True:
     
     # Display detection results
     cv2.putText(frame, f'Number of objects: {object_count}', (10,40), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,255,255), 2) # Draw total number of detected objects
+    material_text = '  '.join(f'{m}: {n}' for m, n in zip(MATERIALS, material_counts.tolist()) if n)
+    if material_text:
+        cv2.putText(frame, material_text, (10,60), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,255,255), 2) # Draw per-material counts
     cv2.imshow('YOLO detection results',frame) # Display image
-    if record: recorder.write(frame)
+    if record:
+        recorder.write(frame)
+        if object_count:
+            recorder.trigger('detection')
 
     # If inferencing on individual images, wait for user keypress before moving to next image. Otherwise, wait 5ms before moving to next frame.
     if source_type == 'image' or source_type == 'folder':
@@ -222,28 +282,36 @@ while True:
     elif key == ord('s') or key == ord('S'): # Press 's' to pause inference
         cv2.waitKey()
     elif key == ord('p') or key == ord('P'): # Press 'p' to save a picture of results on this frame
-        cv2.imwrite('capture.png',frame)
+        recorder.snapshot(frame, 'capture.png')
     
-    # Calculate FPS for this frame
+    # Calculate FPS for this frame (time between rendered frames, since the stages overlap)
     t_stop = time.perf_counter()
-    frame_rate_calc = float(1/(t_stop - t_start))
+    pipeline.record('render', t_stop - t_start)
+    frame_rate_calc = float(1/(t_stop - t_last))
+    t_last = t_stop
 
-    # Append FPS result to frame_rate_buffer (for finding average FPS over multiple frames)
-    if len(frame_rate_buffer) >= fps_avg_len:
-        temp = frame_rate_buffer.pop(0)
-        frame_rate_buffer.append(frame_rate_calc)
-    else:
-        frame_rate_buffer.append(frame_rate_calc)
+    # Append FPS result to the ring buffer and read its rolling mean (both O(1))
+    frame_rate_buffer.append(frame_rate_calc)
+    avg_frame_rate = frame_rate_buffer.mean()
 
-    # Calculate average FPS for past frames
-    avg_frame_rate = np.mean(frame_rate_buffer)
+    # Periodically print per-stage latency and append it to the metrics CSV
+    metrics.periodic(args.metrics_interval, csv_path=args.metrics)
 
 
 # Clean up
+pipeline.stop()
 print(f'Average pipeline FPS: {avg_frame_rate:.2f}')
+pipeline.report()
+if gate is not None:
+    print('Motion gate:', gate.stats())
+if args.metrics:
+    metrics.write_csv(args.metrics)
 if source_type == 'video' or source_type == 'usb':
     cap.release()
 elif source_type == 'picamera':
-    cap.stop()
-if record: recorder.release()
+    print(f'Picamera frames dropped with every ring slot in use: {cap.dropped}')
+    cap.close()
+recorder.stop()
+if record:
+    print('Recorder:', recorder.stats())
 cv2.destroyAllWindows()